@@ -0,0 +1,276 @@
+# This work is licensed under a Creative Commons Attribution 4.0 International License.
+# You must give appropriate credit, provide a link to the license, and indicate if changes were made.
+# Details: https://creativecommons.org/licenses/by/4.0/
+
+"""Benchmarks crawling, link checking, content analysis and sitemap parsing against a synthetic site.
+
+Usage: python benchmarks/bench_crawl.py [--pages 500] [--fan-out 10] [--page-size 20000] [--latency 0.01]
+                                        [--error-rate 0.02] [--output results.json] [--compare baseline.json]
+
+The site is generated from a seed and served by a local HTTP server in its own process, so runs are
+reproducible and need no network. Each scenario runs in a fresh process and reports items per second,
+p50/p99 request latency and the peak RSS of that process. Save the results of one version with
+--output and pass them to --compare when benchmarking the next one.
+
+The per-host rate limiter is opened up so the crawl engine, not the politeness delay, is measured.
+Use --polite to benchmark with the default rate limiting.
+"""
+
+import argparse
+import concurrent.futures
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+SCENARIOS = ('crawl', 'links', 'content', 'sitemap')
+SITEMAP_FILE_URLS = 50000  # URLs per sitemap file, the limit of the sitemap protocol
+
+# Latency buckets from 0.1 ms to 60 s, 5% apart, so percentiles are accurate to a few percent
+LATENCY_BUCKETS = tuple(0.0001 * 1.05 ** i for i in range(275))
+
+WORDS = ('crawl', 'page', 'link', 'content', 'table', 'request', 'server', 'scraper', 'parse', 'data',
+         'network', 'latency', 'metric', 'result', 'header', 'cache', 'queue', 'worker', 'domain', 'index')
+
+class SyntheticSite:
+    """Deterministic site: page i links to `fan_out` pages chosen from the seed, and the pages in
+    `errors` answer with an error status. /links.html links to every page and /sitemap_index.xml lists
+    `sitemap_urls` URLs in gzip-compressed sitemaps."""
+
+    def __init__(self, pages, fan_out, page_size, error_rate, sitemap_urls, seed):
+        self.pages = pages
+        self.page_size = page_size
+        self.sitemap_urls = sitemap_urls
+        generator = random.Random(seed)
+        self.links = [[0] if i == pages - 1 else [i + 1] + [generator.randrange(pages) for _ in range(fan_out - 1)]
+                      for i in range(pages)]
+        # The start page never fails, so the whole site stays reachable
+        self.errors = {i for i in range(1, pages) if generator.random() < error_rate}
+        self.filler = ' '.join(generator.choice(WORDS) for _ in range(page_size // 6 + 1))
+
+    def page(self, i):
+        links = ''.join(f'<li><a href="/p/{target}.html">Page {target}</a></li>' for target in self.links[i])
+        head = (f'<!DOCTYPE html><html><head><title>Page {i}</title>'
+                f'<meta name="description" content="Synthetic page {i}"></head><body>'
+                f'<h1>Page {i}</h1><ul>{links}</ul>'
+                f'<p>Contact team{i}@example.com or +1 555-010-{i % 10000:04d}.</p>'
+                f'<table><tr><th>Key</th><th>Value</th></tr><tr><td>page</td><td>{i}</td></tr></table>'
+                f'<img src="/static/{i}.png" alt="Image {i}"><script src="/static/app.js"></script>')
+        tail = '</body></html>'
+        filler_size = max(0, self.page_size - len(head) - len(tail) - 7)
+        return f'{head}<p>{self.filler[:filler_size]}</p>{tail}'.encode('utf-8')
+
+    def links_page(self):
+        links = ''.join(f'<a href="/p/{i}.html">{i}</a>' for i in range(self.pages))
+        return f'<!DOCTYPE html><html><head><title>Links</title></head><body>{links}</body></html>'.encode('utf-8')
+
+    def sitemap_count(self):
+        return max(1, -(-self.sitemap_urls // SITEMAP_FILE_URLS))
+
+    def sitemap_index(self, base_url):
+        entries = ''.join(f'<sitemap><loc>{base_url}/sitemap-{n}.xml.gz</loc></sitemap>'
+                          for n in range(self.sitemap_count()))
+        return ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f'{entries}</sitemapindex>').encode('utf-8')
+
+    def sitemap(self, base_url, n):
+        first = n * SITEMAP_FILE_URLS
+        entries = ''.join(f'<url><loc>{base_url}/p/{i % self.pages}.html?v={i}</loc><lastmod>2024-01-01</lastmod></url>'
+                          for i in range(first, min(first + SITEMAP_FILE_URLS, self.sitemap_urls)))
+        xml = ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+               f'{entries}</urlset>')
+        return gzip.compress(xml.encode('utf-8'), compresslevel=6)
+
+def serve(site, latency, error_status, ready):
+    """Runs the fixture server until the process is terminated. Sends the port through `ready`."""
+    sitemaps = {}
+    sitemaps_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes: without this, delayed ACKs add ~40 ms to keep-alive requests
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            base_url = f'http://{self.headers["Host"]}'
+            path = self.path.split('?', 1)[0]
+            if path == '/robots.txt':
+                self.send_body(200, f'User-agent: *\nAllow: /\nSitemap: {base_url}/sitemap_index.xml\n'.encode(),
+                               'text/plain')
+            elif path == '/links.html':
+                self.send_body(200, site.links_page(), 'text/html; charset=utf-8')
+            elif path == '/sitemap_index.xml':
+                self.send_body(200, site.sitemap_index(base_url), 'application/xml')
+            elif path.startswith('/sitemap-') and path.endswith('.xml.gz'):
+                n = int(path[len('/sitemap-'):-len('.xml.gz')])
+                with sitemaps_lock:
+                    if n not in sitemaps:
+                        sitemaps[n] = site.sitemap(base_url, n)
+                self.send_body(200, sitemaps[n], 'application/gzip')
+            elif path.startswith('/p/') and path.endswith('.html') and path[3:-5].isdigit() and int(path[3:-5]) < site.pages:
+                i = int(path[3:-5])
+                if i in site.errors:
+                    self.send_body(error_status, b'Error', 'text/plain')
+                else:
+                    self.send_body(200, site.page(i), 'text/html; charset=utf-8')
+            elif path.startswith('/static/'):
+                self.send_body(200, b'', 'application/octet-stream')
+            else:
+                self.send_body(404, b'Not Found', 'text/plain')
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_scenario(name, base_url, pages, polite):
+    """Runs one scenario in this (fresh) process and returns its measurements."""
+    import scrapez
+    # Failed requests are expected on this site: keep their log lines out of the report
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    if not polite:
+        scrapez.rate_limiter = scrapez.HostRateLimiter(burst=1000, start_interval=0.0001, min_interval=0.0001)
+    scrapez.metrics.reset(LATENCY_BUCKETS)
+    start_url = f'{base_url}/p/0.html'
+    start_time = time.perf_counter()
+    if name == 'crawl':
+        items = len(scrapez.scrape_pages_links(start_url, scrapez.SeenSet(), first_call=False)) + 1
+    elif name == 'links':
+        items = len(scrapez.get_link_report(f'{base_url}/links.html'))
+    elif name == 'content':
+        for i in range(pages):
+            scrapez.get_content_analysis(f'{base_url}/p/{i}.html')
+        items = pages
+    elif name == 'sitemap':
+        items = len(scrapez.parse_sitemap(start_url))
+    seconds = time.perf_counter() - start_time
+
+    snapshot = scrapez.metrics.snapshot()
+    fetches = [timing for timing in snapshot['timings'] if timing['stage'] == 'fetch']
+    errors = sum(counter['value'] for counter in snapshot['counters']
+                 if counter['name'] == 'requests' and not str(counter['labels'].get('status')).startswith(('2', '3')))
+    requests_made = sum(counter['value'] for counter in snapshot['counters'] if counter['name'] == 'requests')
+    fetch = fetches[0] if fetches else None
+    return {
+        'items': items,
+        'seconds': seconds,
+        'items_per_second': items / seconds if seconds else None,
+        'requests': requests_made,
+        'failed_requests': errors,
+        'p50_ms': fetch['p50'] * 1000 if fetch else None,
+        'p99_ms': fetch['p99'] * 1000 if fetch else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_comparison(results, baseline):
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'}:")
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous.get('items_per_second') or not result.get('items_per_second'):
+            continue
+        speed = result['items_per_second'] / previous['items_per_second']
+        line = f"  {name:8} {speed:5.2f}x items/s"
+        if previous.get('p99_ms') and result.get('p99_ms'):
+            line += f"  p99 {result['p99_ms'] - previous['p99_ms']:+8.1f} ms"
+        if previous.get('peak_rss_mb') and result.get('peak_rss_mb'):
+            line += f"  RSS {result['peak_rss_mb'] - previous['peak_rss_mb']:+7.1f} MB"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ScrapEZ against a synthetic local site.")
+    parser.add_argument('--pages', type=int, default=500, help="Number of pages on the site")
+    parser.add_argument('--fan-out', type=int, default=10, help="Links per page")
+    parser.add_argument('--page-size', type=int, default=20000, help="Approximate page size in bytes")
+    parser.add_argument('--latency', type=float, default=0.01, help="Seconds the server waits before answering")
+    parser.add_argument('--error-rate', type=float, default=0.02, help="Fraction of pages answering with an error")
+    parser.add_argument('--error-status', type=int, default=404,
+                        help="Status of the error pages (default: 404); 5xx statuses are retried with backoff")
+    parser.add_argument('--sitemap-urls', type=int, default=200000, help="URLs listed in the sitemaps")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the generated site")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help="Scenarios to run (default: all)")
+    parser.add_argument('--polite', action='store_true', help="Keep the default per-host rate limiting")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="Results JSON of an earlier run to compare with")
+    args = parser.parse_args()
+    if args.pages < 1 or args.fan_out < 1:
+        parser.error("--pages and --fan-out must be at least 1")
+
+    site = SyntheticSite(args.pages, args.fan_out, args.page_size, args.error_rate, args.sitemap_urls, args.seed)
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    server = context.Process(target=serve, args=(site, args.latency, args.error_status, ready), daemon=True)
+    server.start()
+    base_url = f'http://127.0.0.1:{ready.get(timeout=30)}'
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'scenarios')}
+    results = {'revision': git_revision(), 'python': sys.version.split()[0], 'config': config, 'scenarios': {}}
+    print(f"Site: {args.pages} pages, fan-out {args.fan_out}, {args.page_size} bytes per page, "
+          f"{args.latency * 1000:.0f} ms latency, {len(site.errors)} error pages")
+    try:
+        for name in args.scenarios:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_scenario, name, base_url, args.pages, args.polite).result()
+            results['scenarios'][name] = result
+            rss = f"{result['peak_rss_mb']:7.1f} MB" if result['peak_rss_mb'] is not None else '    n/a'
+            p50 = f"{result['p50_ms']:7.1f}" if result['p50_ms'] is not None else '    n/a'
+            p99 = f"{result['p99_ms']:7.1f}" if result['p99_ms'] is not None else '    n/a'
+            print(f"{name:8} {result['items']:8} items {result['seconds']:8.2f}s {result['items_per_second']:9.1f}/s  "
+                  f"p50 {p50} ms  p99 {p99} ms  peak RSS {rss}")
+    finally:
+        server.terminate()
+        server.join()
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print_comparison(results, json.load(file))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
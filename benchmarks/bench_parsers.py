@@ -0,0 +1,103 @@
+# This work is licensed under a Creative Commons Attribution 4.0 International License.
+# You must give appropriate credit, provide a link to the license, and indicate if changes were made.
+# Details: https://creativecommons.org/licenses/by/4.0/
+
+"""Compares the parser backends on a corpus of saved HTML pages.
+
+Usage: python benchmarks/bench_parsers.py path/to/corpus [--repeat 3] [--output results.json]
+
+Every available backend parses every *.html/*.htm file in the corpus. The extraction results
+are compared with the html.parser reference and the parse time is reported per backend.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrapez
+
+FIELDS = ('title', 'description', 'headers', 'paragraphs', 'lists', 'blockquotes', 'tables', 'links',
+          'images', 'meta_tags', 'scripts', 'forms', 'iframes', 'comments', 'embedded_links', 'texts', 'noscript',
+          'app_roots', 'json_ld', 'microdata', 'meta_properties')
+
+def normalize(value):
+    """Collapses whitespace so backends that differ only in whitespace handling compare equal."""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    return value
+
+def load_corpus(directory):
+    corpus = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(('.html', '.htm')):
+                with open(os.path.join(root, name), 'rb') as file:
+                    corpus.append((name, file.read()))
+    return corpus
+
+def time_backend(backend, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for name, html in corpus:
+            scrapez.parse_html(html, name, backend=backend)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def compare_backend(backend, corpus):
+    """Returns, per field, how many pages extract the same value as html.parser."""
+    matches = {field: 0 for field in FIELDS}
+    for name, html in corpus:
+        reference = scrapez.parse_html(html, name, backend='html.parser')
+        page = scrapez.parse_html(html, name, backend=backend)
+        for field in FIELDS:
+            if normalize(getattr(reference, field)) == normalize(getattr(page, field)):
+                matches[field] += 1
+    return matches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ScrapEZ parser backends on saved HTML pages.")
+    parser.add_argument('corpus', help="Directory containing saved .html pages")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing runs per backend, the best one is kept")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"No HTML files found in {args.corpus}")
+        return 1
+    total_bytes = sum(len(html) for _, html in corpus)
+    print(f"Corpus: {len(corpus)} pages, {total_bytes / 1024:.0f} KiB")
+
+    results = {'pages': len(corpus), 'bytes': total_bytes, 'backends': {}}
+    reference_time = time_backend('html.parser', corpus, args.repeat)
+    for backend in scrapez.available_parser_backends():
+        elapsed = reference_time if backend == 'html.parser' else time_backend(backend, corpus, args.repeat)
+        matches = compare_backend(backend, corpus)
+        mismatched = [field for field, count in matches.items() if count != len(corpus)]
+        results['backends'][backend] = {
+            'seconds': elapsed,
+            'pages_per_second': len(corpus) / elapsed if elapsed else None,
+            'speedup': reference_time / elapsed if elapsed else None,
+            'matching_pages': matches,
+        }
+        print(f"{backend:12} {elapsed:8.3f}s  {reference_time / elapsed:5.1f}x  "
+              f"differs from html.parser in: {', '.join(mismatched) if mismatched else 'nothing'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
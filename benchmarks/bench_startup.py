@@ -0,0 +1,104 @@
+# This work is licensed under a Creative Commons Attribution 4.0 International License.
+# You must give appropriate credit, provide a link to the license, and indicate if changes were made.
+# Details: https://creativecommons.org/licenses/by/4.0/
+
+"""Measures how long it takes to import scrapez and to start the command line.
+
+Usage: python benchmarks/bench_startup.py [--repeat 10] [--top 10] [--output results.json]
+
+Every measurement runs in a fresh interpreter. The interpreter's own startup is measured
+separately and subtracted, and the heavy optional dependencies that an import pulls in are
+listed, so a module that is imported eagerly again shows up immediately.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('bs4', 'langdetect', 'playwright', 'selenium', 'webdriver_manager', 'lxml', 'selectolax',
+                 'pyarrow', 'psutil')
+
+CASES = {
+    'interpreter': [sys.executable, '-c', 'pass'],
+    'import': [sys.executable, '-c', 'import scrapez'],
+    'cli --help': [sys.executable, os.path.join(REPO, 'scrapez.py'), '--help'],
+}
+
+def environment():
+    env = dict(os.environ)
+    # Cached bytecode is what users get after the first run
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = REPO + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+def time_command(command, repeat, env):
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run(command, env=env, cwd=REPO, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+def loaded_heavy_modules(env):
+    """Returns the heavy dependencies present in sys.modules right after `import scrapez`."""
+    code = f"import sys, scrapez; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', code], env=env, cwd=REPO, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    return output.split(',') if output else []
+
+def slowest_imports(env, top):
+    """Returns the top-level imports of scrapez that take the most time, from python -X importtime."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import scrapez'], env=env, cwd=REPO,
+                            check=True, capture_output=True, text=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Direct imports of scrapez are indented by exactly one level
+        if name.startswith('   ') and not name.startswith('     '):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ScrapEZ import and command line startup time.")
+    parser.add_argument('--repeat', type=int, default=10, help="Runs per measurement, the median is reported")
+    parser.add_argument('--top', type=int, default=10, help="Number of slowest imports to list")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    env = environment()
+    # Warm-up run: writes the bytecode cache and fills the OS file cache
+    time_command(CASES['import'], 1, env)
+
+    results = {'python': sys.version.split()[0], 'cases': {}}
+    for name, command in CASES.items():
+        timings = time_command(command, args.repeat, env)
+        results['cases'][name] = {'median': statistics.median(timings), 'min': min(timings)}
+    interpreter = results['cases']['interpreter']['median']
+    for name, timing in results['cases'].items():
+        timing['over_interpreter'] = timing['median'] - interpreter
+        print(f"{name:12} {timing['median'] * 1000:8.1f} ms median  {timing['min'] * 1000:8.1f} ms min  "
+              f"{timing['over_interpreter'] * 1000:+8.1f} ms over the interpreter")
+
+    results['heavy_modules_on_import'] = loaded_heavy_modules(env)
+    print(f"Heavy modules loaded by import: {', '.join(results['heavy_modules_on_import']) or 'none'}")
+    results['slowest_imports'] = slowest_imports(env, args.top)
+    print("Slowest imports:")
+    for name, milliseconds in results['slowest_imports']:
+        print(f"  {name:30} {milliseconds:8.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,26 +3,48 @@
 # Details: https://creativecommons.org/licenses/by/4.0/
 
 import re
+import sys
+import argparse
+import codecs
+import contextlib
 import requests
-from bs4 import BeautifulSoup
-from bs4.element import Comment
+from requests.adapters import HTTPAdapter
 import urllib.parse
 import time
-from collections import deque
+import abc
+import asyncio
+import bisect
+import atexit
+import datetime
+from email.utils import parsedate_to_datetime
+import functools
+import importlib.util
+import io
+import hashlib
+import html.parser
+import ipaddress
+import itertools
+import math
+import multiprocessing
+import gzip
+import queue
+import secrets
+import socket
+import sqlite3
+import xml.etree.ElementTree as ET
+import threading
+import weakref
+from collections import Counter, defaultdict, deque, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 import json
 import logging
 import os
 from random import choice
-from langdetect import detect
-from playwright.sync_api import sync_playwright
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.firefox.options import Options
-from webdriver_manager.firefox import GeckoDriverManager
 from banner import display_banner
 
-# Configure logging
-logging.basicConfig(filename='scraper.log', level=logging.INFO)
+# Heavy dependencies (BeautifulSoup, langdetect, Playwright, Selenium) are imported by the features
+# that use them, and logging is configured by main()/run_cli(), so importing this module is cheap
+# and has no side effects.
 
 # User-agent rotation
 user_agents = [
@@ -69,289 +91,3454 @@ def sanitize_filename(url):
     sanitized_name = re.sub(r'[^a-zA-Z0-9_\-]', '_', sanitized_name)  # Replace any remaining non-alphanumeric characters
     return sanitized_name
 
+# Instrumentation: per-stage timings and counters for the whole run
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds
+
+class Metrics:
+    """Thread-safe counters and timing histograms, keyed by a name and optional labels.
+
+    Every timing is kept as bucket counts plus count, sum and max, the way Prometheus
+    histograms are, so memory does not grow with the number of requests. Percentiles
+    in the summary are estimated from the buckets.
+    """
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.lock = threading.Lock()
+        self.reset(buckets)
+
+    def reset(self, buckets=None):
+        """Drops every metric recorded so far, and optionally changes the timing buckets."""
+        with self.lock:
+            if buckets is not None:
+                self.buckets = tuple(buckets)
+            self.counters = {}
+            self.timings = {}
+            self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def count(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds, **labels):
+        key = self._key(stage, labels)
+        with self.lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                # One count per bucket, the last one for values above the largest bucket
+                timing = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * (len(self.buckets) + 1)}
+                self.timings[key] = timing
+            timing['count'] += 1
+            timing['sum'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+            timing['buckets'][bisect.bisect_left(self.buckets, seconds)] += 1
+
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time, **labels)
+
+    def timed(self, stage, **labels):
+        """Decorator that records every call of the function as a timing of the stage."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def percentile(self, timing, fraction):
+        """Upper bound of the bucket holding the given fraction of the observations, capped at the max."""
+        if not timing['count']:
+            return 0.0
+        target = fraction * timing['count']
+        seen = 0
+        for bound, count in zip(self.buckets, timing['buckets']):
+            seen += count
+            if seen >= target:
+                return min(bound, timing['max'])
+        return timing['max']
+
+    def snapshot(self):
+        """Returns every metric as plain data, for JSON export or merging into another Metrics."""
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            timings = [{'stage': stage, 'labels': dict(labels), 'count': timing['count'], 'sum': timing['sum'],
+                        'max': timing['max'], 'buckets': list(timing['buckets']),
+                        'p50': self.percentile(timing, 0.5), 'p99': self.percentile(timing, 0.99)}
+                       for (stage, labels), timing in sorted(self.timings.items())]
+        return {'started': self.started, 'elapsed': time.time() - self.started, 'buckets': list(self.buckets),
+                'counters': counters, 'timings': timings}
+
+    def merge(self, snapshot):
+        """Adds the metrics of a snapshot, such as one sent back by a crawl shard process."""
+        with self.lock:
+            for counter in snapshot['counters']:
+                key = self._key(counter['name'], counter['labels'])
+                self.counters[key] = self.counters.get(key, 0) + counter['value']
+            for other in snapshot['timings']:
+                key = self._key(other['stage'], other['labels'])
+                timing = self.timings.setdefault(key, {'count': 0, 'sum': 0.0, 'max': 0.0,
+                                                       'buckets': [0] * (len(self.buckets) + 1)})
+                timing['count'] += other['count']
+                timing['sum'] += other['sum']
+                timing['max'] = max(timing['max'], other['max'])
+                timing['buckets'] = [mine + theirs for mine, theirs in zip(timing['buckets'], other['buckets'])]
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='scrapez'):
+        """Renders the metrics in the Prometheus text exposition format."""
+        def label_text(labels, **extra):
+            pairs = [*labels.items(), *extra.items()]
+            if not pairs:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        snapshot = self.snapshot()
+        lines = []
+        for name in dict.fromkeys(counter['name'] for counter in snapshot['counters']):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for counter in snapshot['counters']:
+                if counter['name'] == name:
+                    lines.append(f"{prefix}_{name}_total{label_text(counter['labels'])} {counter['value']}")
+        if snapshot['timings']:
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for timing in snapshot['timings']:
+            labels = {'stage': timing['stage'], **timing['labels']}
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], timing['buckets']):
+                cumulative += count
+                lines.append(f"{prefix}_stage_seconds_bucket{label_text(labels, le=bound)} {cumulative}")
+            lines.append(f"{prefix}_stage_seconds_sum{label_text(labels)} {timing['sum']}")
+            lines.append(f"{prefix}_stage_seconds_count{label_text(labels)} {timing['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Returns a human-readable run summary: one line per stage, then the counters."""
+        snapshot = self.snapshot()
+        lines = [f"Run summary ({snapshot['elapsed']:.1f} s)",
+                 f"{'stage':36} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for timing in snapshot['timings']:
+            labels = ','.join(f"{key}={value}" for key, value in timing['labels'].items())
+            name = f"{timing['stage']}[{labels}]" if labels else timing['stage']
+            lines.append(f"{name:36} {timing['count']:7} {timing['sum']:9.2f} "
+                         f"{timing['sum'] / timing['count'] * 1000:9.1f} {timing['p50'] * 1000:9.1f} "
+                         f"{timing['p99'] * 1000:9.1f} {timing['max'] * 1000:9.1f}")
+        for counter in snapshot['counters']:
+            labels = ','.join(f"{key}={value}" for key, value in counter['labels'].items())
+            name = f"{counter['name']}[{labels}]" if labels else counter['name']
+            lines.append(f"{name:36} {counter['value']:>7}")
+        return '\n'.join(lines)
+
+metrics = Metrics()
+
+def write_metrics(path):
+    """Writes the run's metrics to a file: Prometheus text for .prom/.txt, JSON otherwise."""
+    content = metrics.to_prometheus() if path.endswith(('.prom', '.txt')) else metrics.to_json()
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+# Shared fetch layer: one pooled session for the whole run plus an in-run response cache
+REQUEST_TIMEOUT = 10
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+RESPONSE_CACHE_SIZE = 256
+MAX_BODY_BYTES = 20 * 1024 * 1024  # Larger bodies are not downloaded; None removes the limit
+FETCH_CHUNK_SIZE = 64 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+_session = None
+_session_lock = threading.Lock()
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def configure_fetcher(pool_connections=None, pool_maxsize=None, timeout=None, cache_size=None, max_body_bytes=False):
+    """Changes pool sizes, timeout, cache size and body size limit. Rebuilds the shared session on the next request."""
+    global REQUEST_TIMEOUT, POOL_CONNECTIONS, POOL_MAXSIZE, RESPONSE_CACHE_SIZE, MAX_BODY_BYTES, _session
+    with _session_lock:
+        if max_body_bytes is not False:
+            MAX_BODY_BYTES = max_body_bytes
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if timeout is not None:
+            REQUEST_TIMEOUT = timeout
+        if cache_size is not None:
+            RESPONSE_CACHE_SIZE = cache_size
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_session():
+    """Returns the process-wide session, creating it with pooled adapters on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def get_cached_response(url):
+    with _response_cache_lock:
+        response = _response_cache.get(url)
+        if response is not None:
+            _response_cache.move_to_end(url)
+        return response
+
+def cache_response(url, response):
+    if RESPONSE_CACHE_SIZE <= 0:
+        return
+    with _response_cache_lock:
+        _response_cache[url] = response
+        _response_cache.move_to_end(url)
+        while len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def clear_response_cache():
+    with _response_cache_lock:
+        _response_cache.clear()
+
+# Persistent HTTP cache: bodies and validators kept between runs, revalidated with conditional GETs
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+HOP_BY_HOP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+class HttpCache:
+    """SQLite store of response bodies with their ETag/Last-Modified validators.
+
+    A cached URL is requested again with If-None-Match/If-Modified-Since, and a 304 is
+    answered from the cache together with the ParsedPage stored for that body, so an
+    unchanged page is neither downloaded nor parsed again. The least recently used
+    entries are evicted when the cache grows past max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, etag TEXT, '
+                                'last_modified TEXT, headers TEXT NOT NULL, body BLOB NOT NULL, page TEXT, '
+                                'size INTEGER NOT NULL, accessed REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+        self.connection.commit()
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def validators(self, url):
+        """Returns the conditional request headers for a cached URL, or {} if it is not cached."""
+        with self.lock:
+            row = self.connection.execute('SELECT etag, last_modified FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return {}
+        headers = {}
+        if row[0]:
+            headers['If-None-Match'] = row[0]
+        if row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def load(self, url, not_modified):
+        """Builds a 200 response from the cached entry, answering the given 304 response."""
+        with self.lock:
+            row = self.connection.execute('SELECT headers, body, page FROM entries WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute('UPDATE entries SET accessed = ? WHERE url = ?', (time.time(), url))
+            self.connection.commit()
+        headers, body, page = row
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = not_modified.url or url
+        response.headers = requests.structures.CaseInsensitiveDict(json.loads(headers))
+        response.headers.update({key: value for key, value in not_modified.headers.items()
+                                 if key.lower() not in HOP_BY_HOP_HEADERS})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = body
+        response.elapsed = not_modified.elapsed
+        response.request = not_modified.request
+        response.from_http_cache = True
+        if page:
+            values = json.loads(page)
+            if values.get('schema') == PARSED_PAGE_SCHEMA:
+                response.parsed_page = ParsedPage.from_dict(values)
+        return response
+
+    def store(self, url, response):
+        """Caches a response if the server gave it a validator and allows storing it."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified) or 'no-store' in response.headers.get('Cache-Control', '').lower():
+            return
+        headers = {key: value for key, value in response.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+        body = response.content
+        with self.lock:
+            previous = self.connection.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO entries (url, etag, last_modified, headers, body, page, '
+                                    'size, accessed) VALUES (?, ?, ?, ?, ?, NULL, ?, ?)',
+                                    (url, etag, last_modified, json.dumps(headers), body, len(body), time.time()))
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self.connection.commit()
+
+    def store_page(self, url, page):
+        with self.lock:
+            self.connection.execute('UPDATE entries SET page = ? WHERE url = ?', (json.dumps(page.to_dict()), url))
+            self.connection.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute('SELECT url, size FROM entries ORDER BY accessed LIMIT 100').fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for url, size in rows:
+                self.connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes * 0.9:
+                    return
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+_http_cache = None
+
+def enable_http_cache(path, max_bytes=HTTP_CACHE_MAX_BYTES):
+    """Backs retry_request with a persistent HTTP cache stored in the given SQLite file."""
+    global _http_cache
+    disable_http_cache()
+    _http_cache = HttpCache(path, max_bytes)
+    return _http_cache
+
+def disable_http_cache():
+    global _http_cache
+    if _http_cache is not None:
+        _http_cache.close()
+        _http_cache = None
+
+# Change detection: page fingerprints kept between runs, so unchanged pages are not analyzed again
+SIMHASH_BITS = 64
+NEAR_DUPLICATE_DISTANCE = 3  # Simhash bits two pages may differ in and still be near-duplicates
+NEAR_DUPLICATE_MIN_WORDS = 50  # Pages with fewer distinct words are only collapsed when identical
+SIMHASH_WORD = re.compile(r'\w+')
+
+def simhash(words):
+    """64-bit simhash of a list of words: pages whose texts mostly overlap differ in only a few bits."""
+    weights = [0] * SIMHASH_BITS
+    for word, count in Counter(words).items():
+        digest = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if digest >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+def page_fingerprint(page):
+    """Returns the SHA-256 of a page's visible text and of its set of links, which identify duplicates."""
+    content = hashlib.sha256(' '.join(page.text.split()).encode('utf-8')).hexdigest()
+    links = hashlib.sha256('\n'.join(sorted(set(page.hrefs))).encode('utf-8')).hexdigest()
+    return content, links
+
+def page_digest(page):
+    """Returns the SHA-256 of everything parsed from a page (meta tags, scripts, forms, structured
+    data...), which decides whether stored analyzer results still hold."""
+    values = json.dumps(page.to_dict(), sort_keys=True, default=_json_default)
+    return hashlib.sha256(values.encode('utf-8')).hexdigest()
+
+class ChangeTracker:
+    """SQLite store of page fingerprints and of the analyzer results computed for them.
+
+    A page is unchanged when the digest of everything parsed from it (page_digest) is the one
+    stored by the previous run; analyzers decorated with skip_unchanged then return the stored
+    result instead of running, until it is older than max_age seconds. A changed page drops every
+    stored result. Pages are also compared by the hashes of their text and links and by simhash with
+    the other pages of this run, so pagination or session-parameter variants of one page can be
+    collapsed into it (see duplicate_of).
+    """
+
+    def __init__(self, path, distance=NEAR_DUPLICATE_DISTANCE, max_age=None):
+        self.path = path
+        self.distance = distance
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # Shard processes share the file, so wait for each other's writes instead of failing
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, content TEXT NOT NULL, '
+                                'links TEXT NOT NULL, simhash INTEGER NOT NULL, words INTEGER NOT NULL, '
+                                'results TEXT NOT NULL, changed REAL NOT NULL, digest TEXT)')
+        self.connection.commit()
+        self.states = {}
+        # Simhashes of this run's pages, indexed by each of their 16-bit bands: two simhashes within
+        # NEAR_DUPLICATE_DISTANCE bits of each other always share at least one band
+        self.bands = defaultdict(list)
+        self.identical = {}
+        self.originals = {}
+
+    def check(self, url, page):
+        """Compares a page with the previous run and returns 'new', 'changed' or 'unchanged'."""
+        with self.lock:
+            if url in self.states:
+                return self.states[url][0]
+            row = self.connection.execute('SELECT digest, content, links, simhash, words FROM pages WHERE url = ?',
+                                          (url,)).fetchone()
+        digest = page_digest(page)
+        content, links = page_fingerprint(page)
+        if row is not None and row[0] == digest:
+            state, fingerprint, words = 'unchanged', row[3] & (1 << SIMHASH_BITS) - 1, row[4]
+        else:
+            state = 'new' if row is None else 'changed'
+            tokens = SIMHASH_WORD.findall(page.text.lower())
+            fingerprint, words = simhash(tokens), len(set(tokens))
+        with self.lock:
+            if url in self.states:
+                return self.states[url][0]
+            if state != 'unchanged':
+                # SQLite integers are signed 64-bit
+                self.connection.execute('INSERT OR REPLACE INTO pages (url, content, links, simhash, words, results, '
+                                        'changed, digest) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                        (url, content, links, fingerprint - (fingerprint >> 63 << 64), words, '{}',
+                                         time.time(), digest))
+                self.connection.commit()
+            self.states[url] = (state, content, links, fingerprint, words)
+        metrics.count('pages_checked', state=state)
+        return state
+
+    def duplicate_of(self, url, page):
+        """Returns the URL of an earlier page of this run that this one duplicates, or None.
+
+        Pages are duplicates when their text and links are identical, and near-duplicates when they
+        have at least NEAR_DUPLICATE_MIN_WORDS distinct words and their simhashes differ in at most
+        `distance` bits. A page that duplicates none is remembered for the pages that follow.
+        """
+        self.check(url, page)
+        with self.lock:
+            if url in self.originals:
+                return self.originals[url]
+            _, content, links, fingerprint, words = self.states[url]
+            original = self.identical.setdefault((content, links), url)
+            if original == url and words >= NEAR_DUPLICATE_MIN_WORDS:
+                bands = [(band, fingerprint >> band * 16 & 0xFFFF) for band in range(SIMHASH_BITS // 16)]
+                original = next((other for band in bands for other_fingerprint, other in self.bands[band]
+                                 if bin(fingerprint ^ other_fingerprint).count('1') <= self.distance), url)
+                self.identical[(content, links)] = original
+                if original == url:
+                    for band in bands:
+                        self.bands[band].append((fingerprint, url))
+            self.originals[url] = original if original != url else None
+            if original != url:
+                metrics.count('duplicates')
+            return self.originals[url]
+
+    def result(self, url, analyzer):
+        """Returns (True, result) if the analyzer's result for an unchanged page is stored, else (False, None)."""
+        with self.lock:
+            row = self.connection.execute('SELECT results FROM pages WHERE url = ?', (url,)).fetchone()
+        stored = json.loads(row[0]).get(analyzer) if row else None
+        if stored is None or (self.max_age is not None and time.time() - stored[0] > self.max_age):
+            return False, None
+        return True, stored[1]
+
+    def store_result(self, url, analyzer, result):
+        with self.lock:
+            row = self.connection.execute('SELECT results FROM pages WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return
+            results = json.loads(row[0])
+            results[analyzer] = [time.time(), result]
+            self.connection.execute('UPDATE pages SET results = ? WHERE url = ?',
+                                    (json.dumps(results, default=_json_default), url))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+_change_tracker = None
+
+def enable_change_detection(path, distance=NEAR_DUPLICATE_DISTANCE, max_age=None):
+    """Keeps page fingerprints in the given SQLite file and skips analyzers on unchanged pages."""
+    global _change_tracker
+    disable_change_detection()
+    _change_tracker = ChangeTracker(path, distance, max_age)
+    return _change_tracker
+
+def disable_change_detection():
+    global _change_tracker
+    if _change_tracker is not None:
+        _change_tracker.close()
+        _change_tracker = None
+
+def find_duplicate(url):
+    """With change detection enabled, returns the earlier page of this run that url duplicates, or None."""
+    tracker = _change_tracker
+    page = get_page(url) if tracker is not None else None
+    return tracker.duplicate_of(url, page) if page is not None else None
+
+def skip_unchanged(analyzer):
+    """Decorator for analyzers of one URL: with change detection enabled, a page that parses to the
+    same page as in the previous run gets that run's result back instead of being analyzed again."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(url, *args, **kwargs):
+            tracker = _change_tracker
+            page = get_page(url) if tracker is not None else None
+            if page is None:
+                return function(url, *args, **kwargs)
+            if tracker.check(url, page) == 'unchanged':
+                found, result = tracker.result(url, analyzer)
+                if found:
+                    metrics.count('analyses_skipped', analyzer=analyzer)
+                    return result
+            result = function(url, *args, **kwargs)
+            tracker.store_result(url, analyzer, result)
+            return result
+        return wrapper
+    return decorate
+
+# Per-host rate limiting: a token bucket per host that adapts to how the host responds
+RATE_LIMIT_BURST = 4
+RATE_LIMIT_START_INTERVAL = 0.5  # Seconds per request for a host we know nothing about yet
+RATE_LIMIT_MIN_INTERVAL = 0.05
+RATE_LIMIT_MAX_INTERVAL = 60
+HEALTHY_LATENCY = 1.0
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+class HostRateLimiter:
+    """Token bucket per host.
+
+    Each host refills one token every `interval` seconds. The interval shrinks while the host
+    answers quickly and grows on slow answers, errors, 429 and 503. A Crawl-delay or a
+    politeness delay is a floor the interval never goes below.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, start_interval=RATE_LIMIT_START_INTERVAL,
+                 min_interval=RATE_LIMIT_MIN_INTERVAL, max_interval=RATE_LIMIT_MAX_INTERVAL):
+        self.burst = burst
+        self.start_interval = start_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = {'interval': self.start_interval, 'tokens': 1.0, 'updated': time.monotonic(),
+                     'crawl_delay': 0.0, 'politeness': 0.0, 'blocked_until': 0.0}
+            self.hosts[host] = state
+        return state
+
+    def _floor(self, state):
+        return max(self.min_interval, state['crawl_delay'], state['politeness'])
+
+    def _capacity(self, state):
+        # A host with an explicit delay gets no bursts
+        return 1.0 if max(state['crawl_delay'], state['politeness']) > 0 else float(self.burst)
+
+    def set_crawl_delay(self, host, seconds):
+        with self.lock:
+            state = self._state(host)
+            state['crawl_delay'] = seconds
+            state['interval'] = max(state['interval'], self._floor(state))
+
+    def set_politeness(self, host, seconds):
+        with self.lock:
+            state = self._state(host)
+            state['politeness'] = seconds or 0.0
+            state['interval'] = max(state['interval'], self._floor(state))
+
+    def reserve(self, host):
+        """Takes a token for the host and returns how many seconds the caller must wait before using it."""
+        with self.lock:
+            state = self._state(host)
+            now = time.monotonic()
+            elapsed = now - state['updated']
+            state['tokens'] = min(self._capacity(state), state['tokens'] + elapsed / state['interval'])
+            state['updated'] = now
+            state['tokens'] -= 1
+            wait = -state['tokens'] * state['interval'] if state['tokens'] < 0 else 0.0
+            return max(wait, state['blocked_until'] - now)
+
+    def wait(self, host):
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self, host, seconds):
+        """Blocks the host for the given number of seconds."""
+        with self.lock:
+            state = self._state(host)
+            state['blocked_until'] = max(state['blocked_until'], time.monotonic() + seconds)
+
+    def record(self, host, status_code, latency, retry_after=None):
+        """Adapts the host's rate to the outcome of a request (status_code is None on connection errors)."""
+        with self.lock:
+            state = self._state(host)
+            if status_code in (429, 503):
+                state['interval'] = min(self.max_interval, state['interval'] * 2)
+                pause = retry_after if retry_after is not None else state['interval']
+                state['blocked_until'] = max(state['blocked_until'], time.monotonic() + pause)
+                state['tokens'] = min(state['tokens'], 0.0)
+            elif status_code is None or status_code >= 500:
+                state['interval'] = min(self.max_interval, state['interval'] * 1.5)
+            elif latency > HEALTHY_LATENCY:
+                state['interval'] = min(self.max_interval, state['interval'] * 1.25)
+            else:
+                state['interval'] = max(self._floor(state), state['interval'] * 0.8)
+
+rate_limiter = HostRateLimiter()
+
+def parse_retry_after(value):
+    """Returns the Retry-After header value in seconds, or None if it is missing or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def parse_crawl_delay(robots_txt, user_agent='*'):
+    """Returns the Crawl-delay that applies to the user agent, or None if robots.txt sets none."""
+    applies = False
+    in_rules = False
+    delay = None
+    for line in robots_txt.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        field, value = (part.strip() for part in line.split(':', 1))
+        field = field.lower()
+        if field == 'user-agent':
+            if in_rules:
+                applies = False
+                in_rules = False
+            applies = applies or value == '*' or (value and value.lower() in user_agent.lower())
+        else:
+            in_rules = True
+            if field == 'crawl-delay' and applies:
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+    return delay
+
+def content_type_allowed(response, content_types):
+    """True if the response's media type is one of content_types. A missing Content-Type is allowed."""
+    content_type = response.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+    return not content_type or content_type in content_types
+
+def _read_body(response, max_bytes, body_parser=None):
+    """Reads the body chunk by chunk. Returns None, without reading further, once it grows past max_bytes."""
+    if body_parser is not None:
+        body_parser.reset(response)
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            return None
+        chunks.append(chunk)
+        if body_parser is not None:
+            body_parser.feed(chunk)
+    return b''.join(chunks)
+
+def _reject(response, reason):
+    """Drops the connection of a response whose body will not be downloaded, and marks it as rejected."""
+    response.close()
+    response.rejected = reason
+    response._content = b''
+    response._content_consumed = True
+    metrics.count('bodies_rejected', reason=reason.split(' ', 1)[0])
+    return response
+
+def fetch_response(url, method='GET', headers=None, stream=False, max_bytes=None, content_types=None,
+                   body_parser=None, **kwargs):
+    """Sends one request through the rate limiter and returns the response whatever its status, or None on connection errors.
+
+    Unless stream is set the body is read here in chunks, and the time to the response headers
+    (response.elapsed) and the body download (response.download_time) are recorded separately.
+    A successful response whose media type is not in content_types, or whose body is larger than
+    max_bytes (MAX_BODY_BYTES by default), is not downloaded: it comes back with response.rejected
+    set to the reason. A body_parser's feed() receives the chunks of a 2xx body while they arrive;
+    error pages and 304 responses are not fed to it.
+    """
+    max_bytes = MAX_BODY_BYTES if max_bytes is None else max_bytes
+    host = urllib.parse.urlparse(url).netloc
+    with metrics.timer('rate_limit_wait'):
+        rate_limiter.wait(host)
+    headers = {'User-Agent': choice(user_agents), **(headers or {})}
+    start_time = time.monotonic()
+    try:
+        response = get_session().request(method, url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True, **kwargs)
+        metrics.observe('ttfb', response.elapsed.total_seconds())
+        if not stream:
+            if content_types and 200 <= response.status_code < 300 and not content_type_allowed(response, content_types):
+                return _reject(response, f"content type {response.headers.get('Content-Type')}")
+            content_length = response.headers.get('Content-Length', '')
+            if max_bytes is not None and content_length.isdigit() and int(content_length) > max_bytes:
+                return _reject(response, f"size {content_length} bytes")
+            download_start = time.perf_counter()
+            body = _read_body(response, max_bytes, body_parser if 200 <= response.status_code < 300 else None)
+            if body is None:
+                return _reject(response, f"size over {max_bytes} bytes")
+            response._content = body
+            response._content_consumed = True
+            # Hands the connection back to the pool
+            response.close()
+            response.download_time = time.perf_counter() - download_start
+            # Bytes read from the socket, before Content-Encoding is decoded
+            response.transfer_size = response.raw.tell() if hasattr(response.raw, 'tell') else len(body)
+            metrics.observe('download', response.download_time)
+            metrics.count('bytes_downloaded', len(body))
+            metrics.count('bytes_transferred', response.transfer_size)
+    except requests.exceptions.RequestException as e:
+        rate_limiter.record(host, None, time.monotonic() - start_time)
+        metrics.count('requests', method=method, status='error')
+        logging.error(f"Request failed: {e}")
+        return None
+    metrics.observe('fetch', time.monotonic() - start_time)
+    metrics.count('requests', method=method, status=response.status_code)
+    rate_limiter.record(host, response.status_code, response.elapsed.total_seconds(),
+                        parse_retry_after(response.headers.get('Retry-After')))
+    return response
+
 def get_with_random_user_agent(url):
-    headers = {'User-Agent': choice(user_agents)}
+    response = fetch_response(url)
+    if response is None:
+        return None
+    if getattr(response, 'rejected', None):
+        logging.error(f"Skipped {url}: {response.rejected}")
+        return None
     try:
-        response = requests.get(url, headers=headers)
         response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
         logging.error(f"Request failed: {e}")
         return None
 
-def retry_request(url, retries=3, delay=2):
+def retry_request(url, retries=3, delay=2, use_cache=True, content_types=None, body_parser=None,
+                  keep_rejected=False):
+    """Fetches a URL, retrying transient failures with an exponential per-host backoff starting at `delay` seconds.
+
+    With use_cache, repeat URLs come from the in-run cache and, when enabled, the persistent HTTP cache.
+    Bodies that are too large or not one of content_types are skipped (see fetch_response): None is
+    returned, or with keep_rejected the empty response with its `rejected` reason.
+    """
+    if use_cache:
+        response = get_cached_response(url)
+        if response is not None:
+            metrics.count('cache_hits', cache='memory')
+            return response
+    host = urllib.parse.urlparse(url).netloc
+    http_cache = _http_cache if use_cache else None
     for attempt in range(retries):
+        if attempt:
+            metrics.count('retries')
         try:
-            response = get_with_random_user_agent(url)
-            if response:
+            response = fetch_response(url, headers=http_cache.validators(url) if http_cache else None,
+                                      content_types=content_types, body_parser=body_parser)
+            if response is not None and getattr(response, 'rejected', None):
+                logging.info(f"Skipped {url}: {response.rejected}")
+                return response if keep_rejected else None
+            if response is not None and response.status_code == 304 and http_cache:
+                response = http_cache.load(url, response)
+                metrics.count('cache_hits', cache='http')
+            elif response is not None and response.ok and http_cache:
+                http_cache.store(url, response)
+            if response is not None and http_cache:
+                response.http_cache_key = url
+            if response is not None and response.ok:
+                if use_cache:
+                    cache_response(url, response)
                 return response
+            if response is not None:
+                logging.error(f"Request failed: {response.status_code} for {url}")
+                if response.status_code not in RETRY_STATUSES:
+                    return None
         except Exception as e:
             logging.error(f"Attempt {attempt + 1} failed: {e}")
-        time.sleep(delay)
+        if attempt + 1 < retries:
+            rate_limiter.backoff(host, delay * 2 ** attempt)
     logging.error(f"All {retries} attempts to access {url} failed.")
     return None
 
+@metrics.timed('analyze', analyzer='cookies')
 def handle_cookies(url):
-    session = requests.Session()
     response = retry_request(url)
     if response:
-        cookies = session.cookies.get_dict()
+        cookies = get_session().cookies.get_dict()
+        cookies.update(response.cookies.get_dict())
         return cookies
     return {}
 
-def scrape_subdomain_links(url, visited_urls):
-    queue = deque([url])
-    visited_urls.add(url)
-
-    subdomain_links = set()
-    while queue:
-        current_url = queue.popleft()
-        logging.info(f"Scraping subdomains from {current_url}")
-        response = retry_request(current_url)
-        if not response:
+# Parse-once document model shared by every analyzer
+HEADER_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+NON_VISIBLE_TAGS = {'head', 'title', 'script', 'style', 'noscript', 'template'}
+APP_ROOT_IDS = {'root', 'app', '__next', '__nuxt', 'app-root', 'main-app', 'svelte'}
+
+PARSED_PAGE_SCHEMA = 2  # Bumped when the fields change, so pages cached by older versions are parsed again
+
+class ParsedPage:
+    """Everything the analyzers need from one HTML document, collected in a single tree walk.
+
+    Only plain lists, dicts and strings are kept, so a page can be cached after the tree is gone.
+    """
+
+    def __init__(self, url):
+        self.schema = PARSED_PAGE_SCHEMA
+        self.url = url
+        self.title = None
+        self.description = None
+        self.headers = {tag: [] for tag in HEADER_TAGS}
+        self.paragraphs = []
+        self.lists = {'ul': [], 'ol': []}
+        self.blockquotes = []
+        self.tables = []
+        self.links = []
+        self.images = []
+        self.meta_tags = {}
+        self.scripts = []
+        self.forms = []
+        self.iframes = []
+        self.comments = []
+        self.embedded_links = []
+        self.texts = []
+        self.noscript = []
+        self.app_roots = []
+        self.json_ld = []
+        self.microdata = []
+        self.meta_properties = []
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, values):
+        page = cls(values.get('url'))
+        page.__dict__.update(values)
+        return page
+
+    @property
+    def main_content(self):
+        return ' '.join(self.paragraphs)
+
+    @property
+    def text(self):
+        """Visible text of the page: every text node outside head, script, style, noscript and template."""
+        return ' '.join(self.texts)
+
+    @property
+    def hrefs(self):
+        return [link['url'] for link in self.links]
+
+TABLE_MAX_SPAN = 1000  # Larger rowspan/colspan values are clamped, as browsers do for colspan
+JSON_LD_TYPE = 'application/ld+json'
+STRUCTURE_TAGS = {'table', 'script', 'meta'}  # Tags _collect_structure reads, besides itemscope nodes
+MICRODATA_URL_ATTRIBUTES = {'a': 'href', 'area': 'href', 'link': 'href', 'audio': 'src', 'embed': 'src',
+                            'iframe': 'src', 'img': 'src', 'source': 'src', 'track': 'src', 'video': 'src',
+                            'object': 'data', 'data': 'value', 'meter': 'value', 'meta': 'content', 'time': 'datetime'}
+
+class _Tree:
+    """Node accessors that let the table and microdata readers walk the tree of any parser backend."""
+
+    def __init__(self, children, tag, attribute, has_attribute, text):
+        self.children = children
+        self.tag = tag
+        self.attribute = attribute
+        self.has_attribute = has_attribute
+        self.text = text
+
+_SOUP_TREE = _Tree(children=lambda node: [child for child in node.children if getattr(child, 'name', None)],
+                   tag=lambda node: node.name, attribute=lambda node, name: node.get(name),
+                   has_attribute=lambda node, name: node.has_attr(name), text=lambda node: node.get_text())
+_LXML_TREE = _Tree(children=lambda node: [child for child in node if isinstance(child.tag, str)],
+                   tag=lambda node: node.tag, attribute=lambda node, name: node.get(name),
+                   has_attribute=lambda node, name: name in node.attrib, text=lambda node: node.text_content())
+_LEXBOR_TREE = _Tree(children=lambda node: [child for child in node.iter() if not child.tag.startswith('-')],
+                     tag=lambda node: node.tag, attribute=lambda node, name: node.attributes.get(name),
+                     has_attribute=lambda node, name: name in node.attributes, text=lambda node: node.text(deep=True))
+
+def _span(value):
+    if value is None:
+        return 1
+    try:
+        return min(max(int(value), 1), TABLE_MAX_SPAN)
+    except (TypeError, ValueError):
+        return 1
+
+def build_table(rows, caption=None):
+    """Lays table rows out on a grid and returns {'caption', 'headers', 'rows'}.
+
+    rows holds (section, cells) pairs, section being 'thead', 'tbody' or 'tfoot' and each cell an
+    (is_header, text, rowspan, colspan) tuple. A spanned cell is repeated in every row and column
+    it covers. The header rows are the <thead> rows or, without a <thead>, the leading rows made of
+    <th> cells only; a column is named after its header cells joined by ' / ' (column_N if it has
+    none). The other rows are returned as lists of cell texts, one per column.
+    """
+    grid = []
+    spans = {}
+    previous_section = None
+    for section, cells in rows:
+        if section != previous_section:
+            # Cells do not span from one row group into the next
+            spans = {}
+            previous_section = section
+        row = {}
+        for column, (left, cell) in list(spans.items()):
+            row[column] = cell
+            if left > 1:
+                spans[column] = (left - 1, cell)
+            else:
+                del spans[column]
+        column = 0
+        for is_header, text, rowspan, colspan in cells:
+            while column in row:
+                column += 1
+            for offset in range(colspan):
+                row[column + offset] = (is_header, text)
+                if rowspan > 1:
+                    spans[column + offset] = (rowspan - 1, (is_header, text))
+            column += colspan
+        if row:
+            grid.append((section, row))
+    width = max((max(row) + 1 for _, row in grid), default=0)
+    grid = [(section, [row.get(column, (False, '')) for column in range(width)]) for section, row in grid]
+
+    if any(section == 'thead' for section, _ in grid):
+        header_rows = [row for section, row in grid if section == 'thead']
+        body_rows = [row for section, row in grid if section != 'thead']
+    else:
+        count = next((index for index, (_, row) in enumerate(grid) if not all(is_header for is_header, _ in row)),
+                     len(grid))
+        # A table made of <th> cells only has no header row
+        count = count if count < len(grid) else 0
+        header_rows = [row for _, row in grid[:count]]
+        body_rows = [row for _, row in grid[count:]]
+
+    headers = []
+    for column in range(width):
+        parts = []
+        for row in header_rows:
+            text = row[column][1]
+            if text and text not in parts:
+                parts.append(text)
+        name = ' / '.join(parts) or f"column_{column + 1}"
+        unique, suffix = name, 2
+        while unique in headers:
+            unique, suffix = f"{name}_{suffix}", suffix + 1
+        headers.append(unique)
+    return {'caption': caption, 'headers': headers, 'rows': [[text for _, text in row] for row in body_rows]}
+
+def _read_table(tree, table):
+    """Reads a <table> node, without the rows of the tables nested in it, see build_table."""
+    caption = None
+    rows = []
+    for child in tree.children(table):
+        tag = tree.tag(child)
+        if tag == 'caption':
+            caption = ' '.join(tree.text(child).split())
+        elif tag == 'tr':
+            rows.append(('tbody', child))
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            rows.extend((tag, row) for row in tree.children(child) if tree.tag(row) == 'tr')
+    return build_table([(section, [(tree.tag(cell) == 'th', ' '.join(tree.text(cell).split()),
+                                    _span(tree.attribute(cell, 'rowspan')), _span(tree.attribute(cell, 'colspan')))
+                                   for cell in tree.children(row) if tree.tag(cell) in ('td', 'th')])
+                        for section, row in rows], caption)
+
+def _read_microdata_item(tree, node):
+    """Reads an itemscope node into {'type', 'properties'}; nested items become nested dicts."""
+    properties = {}
+    pending = list(reversed(tree.children(node)))
+    while pending:
+        child = pending.pop()
+        names = (tree.attribute(child, 'itemprop') or '').split()
+        is_item = tree.has_attribute(child, 'itemscope')
+        if names:
+            if is_item:
+                value = _read_microdata_item(tree, child)
+            else:
+                attribute = MICRODATA_URL_ATTRIBUTES.get(tree.tag(child))
+                value = tree.attribute(child, attribute) if attribute else None
+                if value is None:
+                    value = ' '.join(tree.text(child).split())
+            for name in names:
+                properties.setdefault(name, []).append(value)
+        if not is_item:
+            # The properties inside a nested item belong to that item
+            pending.extend(reversed(tree.children(child)))
+    return {'type': tree.attribute(node, 'itemtype'),
+            'properties': {name: values[0] if len(values) == 1 else values for name, values in properties.items()}}
+
+def _collect_structure(page, tree, node, name, attributes):
+    """Collects the tables, JSON-LD blocks, microdata items and meta properties of one node."""
+    if name == 'table':
+        page.tables.append(_read_table(tree, node))
+    elif name == 'script':
+        if (attributes.get('type') or '').split(';')[0].strip().lower() == JSON_LD_TYPE:
+            page.json_ld.append(tree.text(node))
+    elif name == 'meta':
+        if attributes.get('property'):
+            page.meta_properties.append([attributes['property'], attributes.get('content')])
+    if 'itemscope' in attributes and 'itemprop' not in attributes:
+        page.microdata.append(_read_microdata_item(tree, node))
+
+def _nearest_list_type(li):
+    for parent in li.parents:
+        if parent.name in ('ul', 'ol'):
+            return parent.name
+    return None
+
+def _collect_from_soup(page, soup):
+    from bs4.element import Comment, NavigableString
+    for node in soup.descendants:
+        if isinstance(node, Comment):
+            page.comments.append(str(node))
             continue
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        for link in soup.find_all('a', href=True):
-            link_url = link['href']
-            parsed_link = urllib.parse.urlparse(link_url)
-            if parsed_link.netloc != urllib.parse.urlparse(url).netloc and link_url.startswith("http"):
-                if link_url not in visited_urls:
-                    print(link_url)
-                    visited_urls.add(link_url)
-                    queue.append(link_url)
-        time.sleep(1)
-    print("\nSubdomains & related links:")
-    for link in subdomain_links:
-        print(link)
-    
-    return list(subdomain_links)
+        name = getattr(node, 'name', None)
+        if name is None:
+            if type(node) is NavigableString and node.parent.name not in NON_VISIBLE_TAGS:
+                text = node.strip()
+                if text:
+                    page.texts.append(text)
+            continue
+        if node.has_attr('src'):
+            page.embedded_links.append(node['src'])
+        if node.get('id') in APP_ROOT_IDS:
+            page.app_roots.append({'id': node['id'], 'empty': node.find(True) is None and not node.get_text(strip=True)})
+        if name in STRUCTURE_TAGS or 'itemscope' in node.attrs:
+            _collect_structure(page, _SOUP_TREE, node, name, node.attrs)
+        if name in HEADER_TAGS:
+            page.headers[name].append(node.get_text())
+        elif name == 'p':
+            page.paragraphs.append(node.get_text())
+        elif name == 'li':
+            list_type = _nearest_list_type(node)
+            if list_type:
+                page.lists[list_type].append(node.get_text())
+        elif name == 'a':
+            if node.has_attr('href'):
+                page.links.append({'text': node.get_text(), 'url': node['href']})
+        elif name == 'img':
+            page.images.append({'src': node.get('src'), 'alt': node.get('alt')})
+        elif name == 'meta':
+            key = node.get('name', node.get('property', 'unknown'))
+            page.meta_tags[key] = node.get('content')
+            if page.description is None and node.get('name') == 'description':
+                page.description = node.get('content')
+        elif name == 'title':
+            if page.title is None and node.string is not None:
+                page.title = str(node.string)
+        elif name == 'script':
+            page.scripts.append({'src': node.get('src'), 'content': str(node.string) if node.string is not None else None})
+        elif name == 'blockquote':
+            page.blockquotes.append(node.get_text())
+        elif name == 'form':
+            page.forms.append({'action': node.get('action'), 'method': node.get('method'),
+                               'inputs': [{'name': field.get('name'), 'type': field.get('type')}
+                                          for field in node.find_all('input')]})
+        elif name == 'iframe':
+            page.iframes.append({'src': node.get('src')})
+        elif name == 'noscript':
+            page.noscript.append(node.get_text())
+
+def _collect_with_html_parser(page, html):
+    from bs4 import BeautifulSoup
+    _collect_from_soup(page, BeautifulSoup(html, 'html.parser'))
+
+def _collect_with_lxml(page, html):
+    import lxml.etree
+    import lxml.html
+    try:
+        root = lxml.html.document_fromstring(html)
+    except (lxml.etree.ParserError, ValueError):
+        return
+    for event, node in lxml.etree.iterwalk(root, events=('start', 'end', 'comment')):
+        if event != 'start':
+            # Text after a node (its tail) belongs to the node's parent and follows the node's own text
+            tail = node.tail.strip() if node.tail else ''
+            parent = node.getparent()
+            if tail and parent is not None and parent.tag not in NON_VISIBLE_TAGS:
+                page.texts.append(tail)
+            if event == 'comment':
+                page.comments.append(node.text or '')
+            continue
+        name = node.tag
+        if not isinstance(name, str):
+            continue
+        text = node.text.strip() if node.text else ''
+        if text and name not in NON_VISIBLE_TAGS:
+            page.texts.append(text)
+        if 'src' in node.attrib:
+            page.embedded_links.append(node.get('src'))
+        if node.get('id') in APP_ROOT_IDS:
+            page.app_roots.append({'id': node.get('id'), 'empty': len(node) == 0 and not node.text_content().strip()})
+        if name in STRUCTURE_TAGS or node.get('itemscope') is not None:
+            _collect_structure(page, _LXML_TREE, node, name, node.attrib)
+        if name in HEADER_TAGS:
+            page.headers[name].append(node.text_content())
+        elif name == 'p':
+            page.paragraphs.append(node.text_content())
+        elif name == 'li':
+            parent_list = next(node.iterancestors('ul', 'ol'), None)
+            if parent_list is not None:
+                page.lists[parent_list.tag].append(node.text_content())
+        elif name == 'a':
+            if 'href' in node.attrib:
+                page.links.append({'text': node.text_content(), 'url': node.get('href')})
+        elif name == 'img':
+            page.images.append({'src': node.get('src'), 'alt': node.get('alt')})
+        elif name == 'meta':
+            key = node.get('name', node.get('property', 'unknown'))
+            page.meta_tags[key] = node.get('content')
+            if page.description is None and node.get('name') == 'description':
+                page.description = node.get('content')
+        elif name == 'title':
+            if page.title is None:
+                page.title = node.text
+        elif name == 'script':
+            page.scripts.append({'src': node.get('src'), 'content': node.text})
+        elif name == 'blockquote':
+            page.blockquotes.append(node.text_content())
+        elif name == 'form':
+            page.forms.append({'action': node.get('action'), 'method': node.get('method'),
+                               'inputs': [{'name': field.get('name'), 'type': field.get('type')}
+                                          for field in node.iter('input')]})
+        elif name == 'iframe':
+            page.iframes.append({'src': node.get('src')})
+        elif name == 'noscript':
+            page.noscript.append(node.text_content())
 
-def scrape_pages_links(url, visited_urls, first_call=True):
-    logging.info(f"Scraping page links from {url}")
+def _collect_with_selectolax(page, html):
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    if tree.root is None:
+        return
+    for node in tree.root.traverse(include_text=True):
+        name = node.tag
+        if name == '-text':
+            text = node.text_content.strip() if node.text_content else ''
+            if text and node.parent is not None and node.parent.tag not in NON_VISIBLE_TAGS:
+                page.texts.append(text)
+            continue
+        if name == '-comment':
+            page.comments.append(node.comment_content or '')
+            continue
+        attributes = node.attributes
+        if 'src' in attributes:
+            page.embedded_links.append(attributes['src'] or '')
+        if attributes.get('id') in APP_ROOT_IDS:
+            page.app_roots.append({'id': attributes['id'],
+                                   'empty': next(node.iter(), None) is None and not node.text(deep=True).strip()})
+        if name in STRUCTURE_TAGS or 'itemscope' in attributes:
+            _collect_structure(page, _LEXBOR_TREE, node, name, attributes)
+        if name in HEADER_TAGS:
+            page.headers[name].append(node.text(deep=True))
+        elif name == 'p':
+            page.paragraphs.append(node.text(deep=True))
+        elif name == 'li':
+            parent = node.parent
+            while parent is not None and parent.tag not in ('ul', 'ol'):
+                parent = parent.parent
+            if parent is not None:
+                page.lists[parent.tag].append(node.text(deep=True))
+        elif name == 'a':
+            if 'href' in attributes:
+                page.links.append({'text': node.text(deep=True), 'url': attributes['href'] or ''})
+        elif name == 'img':
+            page.images.append({'src': attributes.get('src'), 'alt': attributes.get('alt')})
+        elif name == 'meta':
+            key = attributes.get('name', attributes.get('property', 'unknown'))
+            page.meta_tags[key] = attributes.get('content')
+            if page.description is None and attributes.get('name') == 'description':
+                page.description = attributes.get('content')
+        elif name == 'title':
+            if page.title is None:
+                page.title = node.text() or None
+        elif name == 'script':
+            page.scripts.append({'src': attributes.get('src'), 'content': node.text() or None})
+        elif name == 'blockquote':
+            page.blockquotes.append(node.text(deep=True))
+        elif name == 'form':
+            page.forms.append({'action': attributes.get('action'), 'method': attributes.get('method'),
+                               'inputs': [{'name': field.attributes.get('name'), 'type': field.attributes.get('type')}
+                                          for field in node.css('input')]})
+        elif name == 'iframe':
+            page.iframes.append({'src': attributes.get('src')})
+        elif name == 'noscript':
+            page.noscript.append(node.text(deep=True))
+
+# Parser backends, fastest first. None means the backend only needs the standard library.
+PARSER_BACKENDS = {
+    'selectolax': ('selectolax.lexbor', _collect_with_selectolax),
+    'lxml': ('lxml.html', _collect_with_lxml),
+    'html.parser': (None, _collect_with_html_parser),
+}
+PARSER_BACKEND = None  # None picks the fastest installed backend
+
+def available_parser_backends():
+    available = []
+    for name, (module, _) in PARSER_BACKENDS.items():
+        try:
+            if module is None or importlib.util.find_spec(module) is not None:
+                available.append(name)
+        except ImportError:
+            continue
+    return available
+
+def set_parser_backend(name):
+    """Forces a parser backend by name, or goes back to automatic selection with None."""
+    global PARSER_BACKEND
+    if name is not None and name not in available_parser_backends():
+        raise ValueError(f"Parser backend '{name}' is not available. Choose from {available_parser_backends()}")
+    PARSER_BACKEND = name
+
+def get_parser_backend():
+    return PARSER_BACKEND or available_parser_backends()[0]
+
+def parse_html(html, url=None, backend=None):
+    """Builds a ParsedPage from raw HTML (bytes or str) with the given or the selected backend."""
+    page = ParsedPage(url)
+    backend = backend or get_parser_backend()
+    _, collect = PARSER_BACKENDS[backend]
+    with metrics.timer('parse', backend=backend):
+        collect(page, html)
+    return page
+
+def parse_page(response):
+    """Returns the ParsedPage for a response, parsing it only the first time it is asked for."""
+    page = getattr(response, 'parsed_page', None)
+    if page is None:
+        page = parse_html(response.content, response.url)
+        response.parsed_page = page
+        cache_key = getattr(response, 'http_cache_key', None)
+        if _http_cache is not None and cache_key:
+            _http_cache.store_page(cache_key, page)
+    return page
+
+def get_page(url):
+    """Fetches (or reuses) a URL and returns its ParsedPage, or None if it could not be retrieved."""
     response = retry_request(url)
     if not response:
-        logging.error(f"Failed to retrieve {url}")
-        return []
+        return None
+    return parse_page(response)
+
+class _HrefParser(html.parser.HTMLParser):
+    def __init__(self, on_href):
+        super().__init__(convert_charrefs=True)
+        self.on_href = on_href
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href' and value is not None:
+                    self.on_href(value)
+                    break
+
+class LinkStreamParser:
+    """Incremental link extractor fed with the body chunks of a response while they arrive.
+
+    Pass it as body_parser to retry_request/fetch_response. on_link is called with every
+    <a href> as soon as its tag has been read, so a crawler can queue links before the page
+    has finished downloading. Uses lxml's pull parser when lxml is installed, html.parser otherwise.
+    """
+
+    def __init__(self, on_link):
+        self.on_link = on_link
+        self.base_url = None
+        self.fed = False
+        self.parser = None
+        self.decoder = None
+
+    def reset(self, response):
+        """Starts a new document; called by fetch_response before the first chunk (again on retries)."""
+        self.base_url = response.url
+        self.fed = True
+        # Only trust an explicit charset, requests falls back to ISO-8859-1 for every text/* type
+        content_type = response.headers.get('Content-Type', '')
+        encoding = response.encoding if 'charset' in content_type.lower() else None
+        if importlib.util.find_spec('lxml') is not None:
+            import lxml.etree
+            self.parser = lxml.etree.HTMLPullParser(events=('start',), tag='a', encoding=encoding)
+            self.decoder = None
+        else:
+            self.parser = _HrefParser(self.on_link)
+            self.decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+
+    def _read_events(self):
+        for _, element in self.parser.read_events():
+            href = element.get('href')
+            if href is not None:
+                self.on_link(href)
+
+    def feed(self, chunk):
+        if self.decoder is not None:
+            self.parser.feed(self.decoder.decode(chunk))
+        else:
+            self.parser.feed(chunk)
+            self._read_events()
+
+    def close(self):
+        if self.parser is None:
+            return
+        if self.decoder is not None:
+            self.parser.feed(self.decoder.decode(b'', final=True))
+            self.parser.close()
+        else:
+            import lxml.etree
+            try:
+                self.parser.close()
+            except lxml.etree.XMLSyntaxError as e:
+                # lxml raises on an empty document
+                logging.debug(f"Link parser for {self.base_url}: {e}")
+            self._read_events()
+        self.parser = None
+
+# URL canonicalization and compact seen-sets
+TRACKING_PARAMETERS = {'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+                       'igshid', 'ref_src', 'spm'}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def canonicalize_url(url, base=None):
+    """Returns the canonical form of a URL, resolved against base when it is relative.
+
+    The scheme and host are lowercased, default ports, fragments and tracking parameters are
+    dropped and the query is sorted. Returns None for links that are not HTTP(S).
+    """
+    if base:
+        url = urllib.parse.urljoin(base, url.strip())
+    try:
+        parsed = urllib.parse.urlsplit(url.strip())
+        port = parsed.port
+    except ValueError:
+        return None
+    scheme = parsed.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parsed.hostname:
+        return None
+    host = parsed.hostname.lower().rstrip('.')
+    if ':' in host:
+        host = f"[{host}]"
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parsed.username:
+        userinfo = parsed.username + (f":{parsed.password}" if parsed.password else '')
+        host = f"{userinfo}@{host}"
+    path = urllib.parse.quote(parsed.path or '/', safe="/%:@!$&'()*+,;=~")
+    query = [(key, value) for key, value in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMETERS and not key.lower().startswith(TRACKING_PREFIXES)]
+    return urllib.parse.urlunsplit((scheme, host, path, urllib.parse.urlencode(sorted(query)), ''))
+
+def url_fingerprint(url):
+    """64-bit fingerprint of a URL's canonical form, with /a and /a/ treated as the same page."""
+    canonical = canonicalize_url(url) or url
+    scheme, netloc, path, query, _ = urllib.parse.urlsplit(canonical)
+    if len(path) > 1:
+        path = path.rstrip('/')
+    key = urllib.parse.urlunsplit((scheme, netloc, path, query, ''))
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+class SeenSet:
+    """Set of URLs that only stores their 64-bit fingerprints.
+
+    Lookups canonicalize first, so URL variants of the same page count as one.
+    """
+
+    def __init__(self, urls=()):
+        self.fingerprints = set()
+        for url in urls:
+            self.add(url)
+
+    def add(self, url):
+        self.fingerprints.add(url_fingerprint(url))
+
+    def __contains__(self, url):
+        return url_fingerprint(url) in self.fingerprints
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint):
+        # Double hashing: k positions from two 32-bit halves of the fingerprint
+        first = fingerprint & 0xFFFFFFFF
+        second = (fingerprint >> 32) & 0xFFFFFFFF | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, fingerprint):
+        for position in self._positions(fingerprint):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, fingerprint):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(fingerprint))
+
+class ScalableBloomFilter:
+    """Seen-set for very large crawls: a chain of Bloom filters that grows as URLs are added.
+
+    Each new filter is `growth` times larger with a tighter error rate, so the overall false
+    positive rate stays below `error_rate`. A false positive means a page is skipped, never
+    that one is fetched twice.
+    """
+
+    def __init__(self, initial_capacity=100000, error_rate=0.001, growth=2, tightening=0.85):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+        self.count = 0
+
+    def _fingerprint(self, url):
+        return url_fingerprint(url) & 0xFFFFFFFFFFFFFFFF
+
+    def add(self, url):
+        fingerprint = self._fingerprint(url)
+        if any(fingerprint in bloom for bloom in self.filters):
+            return
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            capacity = self.initial_capacity * self.growth ** len(self.filters)
+            error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** len(self.filters)
+            self.filters.append(BloomFilter(capacity, error_rate))
+        self.filters[-1].add(fingerprint)
+        self.count += 1
+
+    def __contains__(self, url):
+        fingerprint = self._fingerprint(url)
+        return any(fingerprint in bloom for bloom in self.filters)
+
+    def __len__(self):
+        return self.count
+
+def make_seen_set(bloom=False, **kwargs):
+    """Returns the seen-set used for deduplication: exact fingerprints, or a scalable Bloom filter."""
+    return ScalableBloomFilter(**kwargs) if bloom else SeenSet()
+
+# Subdomain discovery used by scrape_subdomain_links
+SUBDOMAIN_WORKERS = 16
+SUBDOMAIN_PER_HOST = 4
+SUBDOMAIN_MAX_DEPTH = 2  # Link hops from the start page
+SUBDOMAIN_MAX_PAGES = 200  # Pages crawled in all
+SUBDOMAIN_PAGES_PER_HOST = 20
+SUBDOMAIN_MAX_HOSTS = 500
+SUBDOMAIN_SITEMAP_ENTRIES = 5000  # Sitemap entries read per host
+# Second-level labels under which country domains register names (example.co.uk, example.com.au)
+SECOND_LEVEL_LABELS = {'ac', 'co', 'com', 'edu', 'gob', 'gov', 'go', 'ltd', 'mil', 'ne', 'net', 'nhs', 'or', 'org',
+                       'plc', 'sch'}
+
+def registrable_domain(host):
+    """Returns the domain a host was registered under: example.co.uk for www.shop.example.co.uk.
+
+    This is a heuristic, not the public suffix list: a two-letter country domain with a common
+    second-level label (SECOND_LEVEL_LABELS) keeps three labels, everything else two. IP addresses
+    and single-label hosts such as localhost are their own domain.
+    """
+    host = host.lower().rstrip('.')
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return host
+    except ValueError:
+        pass
+    labels = host.split('.')
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+def url_host(url):
+    """Returns the host[:port] of a URL, without any user:password@ part."""
+    return urllib.parse.urlsplit(url).netloc.rsplit('@', 1)[-1]
+
+def in_domain_scope(host, domain):
+    """True if host is the domain itself or one of its subdomains."""
+    return host == domain or host.endswith('.' + domain)
+
+def page_link_urls(page):
+    """Every URL a page points to: anchors, src attributes (scripts, images, frames, media) and form actions."""
+    urls = list(page.hrefs)
+    urls.extend(page.embedded_links)
+    urls.extend(form['action'] for form in page.forms if form['action'])
+    return urls
+
+def discover_subdomains(url, max_depth=SUBDOMAIN_MAX_DEPTH, max_pages=SUBDOMAIN_MAX_PAGES,
+                        pages_per_host=SUBDOMAIN_PAGES_PER_HOST, max_hosts=SUBDOMAIN_MAX_HOSTS,
+                        workers=SUBDOMAIN_WORKERS, per_host=SUBDOMAIN_PER_HOST,
+                        sitemap_entries=SUBDOMAIN_SITEMAP_ENTRIES, visited_urls=None):
+    """Finds the hosts of the start URL's registrable domain, such as example.com, www.example.com
+    and blog.example.com for https://www.example.com/.
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    Hosts are taken from the links, src attributes and form actions of the pages crawled, and from
+    the robots.txt and sitemaps of every host found. The crawl never leaves the domain and stops
+    max_depth links away from the start page, after max_pages pages in all or pages_per_host pages
+    of one host. Pages are fetched level by level by a pool of workers, and every host found is
+    probed concurrently at the end, so hosts only seen in links get a status too.
+
+    Returns {host: {'url', 'depth', 'source', 'status'}} in discovery order; the status is None
+    for hosts that did not answer. Crawled pages of other hosts are added to visited_urls.
+    """
+    start_url = canonicalize_url(url) or url
+    start_host = url_host(start_url)
+    domain = registrable_domain(urllib.parse.urlsplit(start_url).hostname or '')
+    hosts = {}
+    host_pages = {}
+    seen_pages = SeenSet()
+    slots = {}
+    slots_lock = threading.Lock()
+
+    def add_host(link_url, depth, source):
+        """Records the host of an in-scope URL. Returns True the first time the host is seen."""
+        host = url_host(link_url)
+        if host in hosts or len(hosts) >= max_hosts:
+            return False
+        hosts[host] = {'url': f"{urllib.parse.urlsplit(link_url).scheme}://{host}/", 'depth': depth, 'source': source,
+                       'status': None}
+        return True
+
+    def visit(page_url, first_of_host):
+        """Fetches one page and returns [(url, source)] for every URL it leads to."""
+        host = url_host(page_url)
+        with slots_lock:
+            slot = slots.setdefault(host, threading.BoundedSemaphore(per_host))
+        found = []
+        with slot:
+            # A host is probed before anything else is fetched from it, so one that does not answer costs one probe
+            if first_of_host and probe_links([hosts[host]['url']])[0]['status'] is None:
+                return found
+            logging.info(f"Scraping subdomains from {page_url}")
+            response = retry_request(page_url, retries=1, content_types=HTML_CONTENT_TYPES)
+            if response is not None and is_html_response(response):
+                base_url = response.url or page_url
+                found.append((base_url, 'redirect'))
+                found.extend((canonicalize_url(link, base_url), 'page') for link in page_link_urls(parse_page(response)))
+            if first_of_host:
+                robots_txt = get_robots_txt(page_url)
+                found.extend((sitemap_url, 'robots') for sitemap_url in parse_robots_sitemaps(robots_txt or ''))
+                entries = iter_sitemap_urls(page_url)
+                try:
+                    found.extend((loc, 'sitemap') for loc, _ in itertools.islice(entries, sitemap_entries))
+                finally:
+                    entries.close()
+        return found
+
+    def queue_page(page_url, level):
+        host = url_host(page_url)
+        # Pages of hosts left out past max_hosts are not crawled
+        if host not in hosts:
+            return
+        if len(seen_pages) >= max_pages or host_pages.get(host, 0) >= pages_per_host or page_url in seen_pages:
+            return
+        seen_pages.add(page_url)
+        host_pages[host] = host_pages.get(host, 0) + 1
+        # The first page of a host also probes it and reads its robots.txt and sitemaps
+        level.append((page_url, host_pages[host] == 1))
+
+    add_host(start_url, 0, 'start')
+    level = []
+    queue_page(start_url, level)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for depth in range(max_depth + 1):
+            next_level = []
+            for found in executor.map(lambda item: visit(*item), level):
+                for link_url, source in found:
+                    link_url = canonicalize_url(link_url) if link_url else None
+                    if not link_url or not in_domain_scope(urllib.parse.urlsplit(link_url).hostname, domain):
+                        continue
+                    new_host = add_host(link_url, depth + 1, source)
+                    if depth < max_depth:
+                        if new_host:
+                            queue_page(hosts[url_host(link_url)]['url'], next_level)
+                        # Sitemap and robots.txt entries only name hosts, pages come from links
+                        if source in ('page', 'redirect'):
+                            queue_page(link_url, next_level)
+            if visited_urls is not None:
+                for page_url, _ in level:
+                    if url_host(page_url) != start_host:
+                        visited_urls.add(page_url)
+            if not next_level:
+                break
+            level = next_level
+
+    # Hosts crawled above were probed already, probe_links only checks the ones found on the last level
+    for result in probe_links([host['url'] for host in hosts.values()]):
+        hosts[url_host(result['url'])]['status'] = result['status']
+    return hosts
+
+@metrics.timed('analyze', analyzer='subdomains')
+def scrape_subdomain_links(url, visited_urls):
+    """Returns the home page URL of every other host of the site's domain, see discover_subdomains."""
+    hosts = discover_subdomains(url, visited_urls=visited_urls)
+    start_host = url_host(canonicalize_url(url) or url)
+    subdomain_links = [host['url'] for name, host in hosts.items() if name != start_host]
+
+    print("\nSubdomains & related links:")
+    for name, host in hosts.items():
+        if name != start_host:
+            print(f"{host['url']} ({host['status'] or 'no answer'}, found in {host['source']})")
+    return subdomain_links
+
+# Crawl frontiers: the queue of pages to visit plus the set of URLs already seen
+FRONTIER_BATCH_SIZE = 100
+FRONTIER_CHECKPOINT_WRITES = 1000
+FRONTIER_CHECKPOINT_SECONDS = 2
+
+class MemoryFrontier:
+    """In-memory frontier over a seen-set (such as the visited_urls set shared by main)."""
+
+    def __init__(self, seen=None):
+        self.seen = seen if seen is not None else set()
+        self.queue = deque()
+        self.added = []
+
+    def __contains__(self, url):
+        return url in self.seen
+
+    def __len__(self):
+        return len(self.added)
+
+    def add(self, url, depth=0):
+        """Queues a URL unless it was already seen. Returns True if it was new."""
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.queue.append(url)
+        self.added.append(url)
+        return True
+
+    def urls(self):
+        """Yields the URLs this frontier queued, in discovery order."""
+        return iter(self.added)
+
+    def requeue(self, url):
+        self.queue.append(url)
+
+    def pop(self):
+        return self.queue.popleft() if self.queue else None
+
+    def done(self, url):
+        pass
+
+    def pending_count(self):
+        return len(self.queue)
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        pass
+
+class CrawlFrontier:
+    """SQLite-backed frontier and seen-set, so a crawl survives crashes and can be resumed.
+
+    Every URL ever seen is one row: pending, in progress or done. Pages that were in
+    progress when the process died are queued again when the frontier is reopened.
+    Writes are committed every FRONTIER_CHECKPOINT_WRITES changes or FRONTIER_CHECKPOINT_SECONDS.
+    """
+
+    PENDING, IN_PROGRESS, DONE = 0, 1, 2
+
+    def __init__(self, path, checkpoint_writes=FRONTIER_CHECKPOINT_WRITES,
+                 checkpoint_seconds=FRONTIER_CHECKPOINT_SECONDS):
+        self.path = path
+        self.checkpoint_writes = checkpoint_writes
+        self.checkpoint_seconds = checkpoint_seconds
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS urls (fingerprint INTEGER NOT NULL UNIQUE, '
+                                'url TEXT NOT NULL, state INTEGER NOT NULL, depth INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS urls_state ON urls (state)')
+        self.connection.execute('UPDATE urls SET state = ? WHERE state = ?', (self.PENDING, self.IN_PROGRESS))
+        self.connection.commit()
+        self.batch = deque()
+        self.writes = 0
+        self.last_checkpoint = time.monotonic()
+
+    def _written(self, count=1):
+        self.writes += count
+        if self.writes >= self.checkpoint_writes or time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds:
+            self._commit()
+
+    def _commit(self):
+        self.connection.commit()
+        self.writes = 0
+        self.last_checkpoint = time.monotonic()
+
+    def __contains__(self, url):
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM urls WHERE fingerprint = ?',
+                                           (url_fingerprint(url),)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+
+    def add(self, url, depth=0):
+        """Queues a URL unless it was already seen. Returns True if it was new."""
+        with self.lock:
+            cursor = self.connection.execute('INSERT OR IGNORE INTO urls (fingerprint, url, state, depth) '
+                                             'VALUES (?, ?, ?, ?)', (url_fingerprint(url), url, self.PENDING, depth))
+            if cursor.rowcount:
+                self._written()
+            return cursor.rowcount > 0
+
+    def requeue(self, url):
+        with self.lock:
+            self.connection.execute('UPDATE urls SET state = ? WHERE fingerprint = ?',
+                                    (self.PENDING, url_fingerprint(url)))
+            self._written()
+
+    def pop(self):
+        """Returns the next pending URL and marks it in progress, or None when nothing is pending."""
+        with self.lock:
+            if not self.batch:
+                rows = self.connection.execute('SELECT fingerprint, url FROM urls WHERE state = ? '
+                                               'ORDER BY rowid LIMIT ?', (self.PENDING, FRONTIER_BATCH_SIZE)).fetchall()
+                self.connection.executemany('UPDATE urls SET state = ? WHERE fingerprint = ?',
+                                            [(self.IN_PROGRESS, fingerprint) for fingerprint, _ in rows])
+                self.batch.extend(url for _, url in rows)
+                self._written(len(rows))
+            return self.batch.popleft() if self.batch else None
+
+    def done(self, url):
+        with self.lock:
+            self.connection.execute('UPDATE urls SET state = ? WHERE fingerprint = ?', (self.DONE, url_fingerprint(url)))
+            self._written()
+
+    def urls(self):
+        """Yields every URL ever seen, in discovery order, reading FRONTIER_BATCH_SIZE rows at a time."""
+        last_row = 0
+        while True:
+            with self.lock:
+                rows = self.connection.execute('SELECT rowid, url FROM urls WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                                               (last_row, FRONTIER_BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            last_row = rows[-1][0]
+            for _, url in rows:
+                yield url
+
+    def pending_count(self):
+        with self.lock:
+            pending = self.connection.execute('SELECT COUNT(*) FROM urls WHERE state != ?', (self.DONE,)).fetchone()[0]
+            return pending
+
+    def is_finished(self):
+        """True if a previous crawl with this frontier ran to completion."""
+        return len(self) > 0 and self.pending_count() == 0
+
+    def reset(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM urls')
+            self.batch.clear()
+            self._commit()
+
+    def checkpoint(self):
+        with self.lock:
+            self._commit()
+
+    def close(self):
+        with self.lock:
+            # URLs handed out but never crawled go back to pending for the next run
+            self.connection.executemany('UPDATE urls SET state = ? WHERE fingerprint = ?',
+                                        [(self.PENDING, url_fingerprint(url)) for url in self.batch])
+            self.batch.clear()
+            self._commit()
+            self.connection.close()
+
+# Concurrent crawl engine used by scrape_pages_links
+CRAWL_WORKERS = 16
+CRAWL_PER_HOST = 4
+CRAWL_DELAY = None  # Minimum seconds between two requests to the same host, None lets the rate limiter adapt
+
+def is_html_response(response):
+    content_type = response.headers.get('Content-Type', '')
+    return not content_type or 'html' in content_type.lower()
+
+def extract_same_domain_links(page_url, response, domain):
+    """Returns the canonical links of a page that stay on the given domain."""
+    if not is_html_response(response):
+        return []
     links = []
-    for link in soup.find_all('a', href=True):
-        link_url = link['href']
-        if urllib.parse.urlparse(link_url).netloc == urllib.parse.urlparse(url).netloc:
-            if not urllib.parse.urlparse(link_url).netloc:
-                link_url = urllib.parse.urljoin(url, link_url)
-            if link_url not in visited_urls:
-                links.append(link_url)
-                visited_urls.add(link_url)
-    if first_call:
-        print("\nPages Links:")
-        for link in links:
-            print(link)
-            
-    for link in links:
-        time.sleep(1)
-        links.extend(scrape_pages_links(link, visited_urls, first_call=False))
+    # Relative links are resolved against the final URL, after redirects
+    base_url = response.url or page_url
+    for href in parse_page(response).hrefs:
+        link_url = canonicalize_url(href, base_url)
+        if link_url and urllib.parse.urlparse(link_url).netloc == domain:
+            links.append(link_url)
     return links
 
-def scrape_robots_txt(url):
+async def crawl_pages(start_url, visited_urls, workers=CRAWL_WORKERS, per_host=CRAWL_PER_HOST,
+                      delay=CRAWL_DELAY, max_pages=None, frontier=None):
+    """Crawls every page of the start URL's domain with a bounded pool of workers.
+
+    Fetching runs in a thread pool so the blocking fetch layer can be reused, and links are
+    extracted from each page while it downloads (LinkStreamParser). The robots.txt Crawl-delay and `delay`, when given, are the minimum spacing per host.
+    Pass a CrawlFrontier to crawl from (and resume) a frontier on disk; visited_urls, when given,
+    is still honoured: links in it are not queued and queued links are added to it.
+    Returns an iterator over the links in the order they were discovered, read back from the
+    frontier: a resumed crawl also yields the pages found before it was interrupted, and no list
+    of links is held in memory. Consume it before closing a CrawlFrontier.
+    """
+    loop = asyncio.get_running_loop()
+    start_url = canonicalize_url(start_url) or start_url
+    domain = urllib.parse.urlparse(start_url).netloc
+    shared_seen = visited_urls if frontier is not None else None
+    frontier = frontier if frontier is not None else MemoryFrontier(visited_urls)
+    host_slots = {}
+    # A resumed frontier holds the start page and the links found before the restart
+    discovered = max(0, len(frontier) - 1)
+    in_flight = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    # Per-host pacing is done by the rate limiter inside the fetch layer
+    if delay is not None:
+        rate_limiter.set_politeness(domain, delay)
+    await loop.run_in_executor(executor, get_robots_txt, start_url)
+
+    def queue_link(link_url):
+        nonlocal discovered
+        if max_pages is not None and discovered >= max_pages:
+            return
+        if shared_seen is not None:
+            # Pages an earlier feature visited are not crawled again
+            if link_url in shared_seen:
+                return
+            shared_seen.add(link_url)
+        if frontier.add(link_url):
+            discovered += 1
+
+    def fetch_and_extract(page_url):
+        def on_link(href):
+            link_url = canonicalize_url(href, link_parser.base_url or page_url)
+            if link_url and urllib.parse.urlparse(link_url).netloc == domain:
+                loop.call_soon_threadsafe(queue_link, link_url)
+
+        # Links are queued while the page downloads; anything but HTML is not downloaded at all
+        link_parser = LinkStreamParser(on_link)
+        response = retry_request(page_url, content_types=HTML_CONTENT_TYPES, body_parser=link_parser)
+        if not response:
+            logging.error(f"Failed to retrieve {page_url}")
+            return []
+        if not link_parser.fed or getattr(response, 'from_http_cache', False):
+            # Served from a cache, the body was not streamed through the parser
+            return extract_same_domain_links(page_url, response, domain)
+        link_parser.close()
+        return []
+
+    async def worker():
+        nonlocal in_flight
+        while True:
+            page_url = frontier.pop()
+            if page_url is None:
+                # Nothing queued: the crawl is over once no other worker can queue more
+                if in_flight == 0:
+                    return
+                await asyncio.sleep(0.05)
+                continue
+            in_flight += 1
+            try:
+                host = urllib.parse.urlparse(page_url).netloc
+                slots = host_slots.setdefault(host, asyncio.Semaphore(per_host))
+                async with slots:
+                    logging.info(f"Scraping page links from {page_url}")
+                    links = await loop.run_in_executor(executor, fetch_and_extract, page_url)
+                for link_url in links:
+                    queue_link(link_url)
+            except Exception as e:
+                logging.error(f"Crawling {page_url} failed: {e}", exc_info=True)
+            finally:
+                frontier.done(page_url)
+                in_flight -= 1
+
+    if not frontier.add(start_url) and not frontier.pending_count():
+        # The start page was seen by an earlier feature: crawl it again all the same
+        frontier.requeue(start_url)
+    if shared_seen is not None:
+        shared_seen.add(start_url)
+    try:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        frontier.checkpoint()
+        executor.shutdown(wait=False)
+    return (link_url for link_url in frontier.urls() if link_url != start_url)
+
+@metrics.timed('analyze', analyzer='pages')
+def scrape_pages_links(url, visited_urls, first_call=True, workers=CRAWL_WORKERS, per_host=CRAWL_PER_HOST,
+                       delay=CRAWL_DELAY, max_pages=None, state_path=None):
+    """Crawls the site's pages. With state_path, the frontier lives in that SQLite file and an
+    interrupted crawl resumes where it stopped; a finished one starts over."""
+    logging.info(f"Crawling pages of {url} with {workers} workers")
+    frontier = None
+    if state_path:
+        frontier = CrawlFrontier(state_path)
+        if frontier.is_finished():
+            frontier.reset()
+        elif len(frontier):
+            print(f"Resuming crawl from {state_path} ({frontier.pending_count()} pages left)")
+    try:
+        links = asyncio.run(crawl_pages(url, visited_urls, workers=workers, per_host=per_host,
+                                        delay=delay, max_pages=max_pages, frontier=frontier))
+        if first_call:
+            print("\nPages Links:")
+        # The record of this feature needs the list; crawl_pages itself streams the links from the frontier
+        pages_links = []
+        for link in links:
+            if first_call:
+                print(link)
+            pages_links.append(link)
+    finally:
+        if frontier is not None:
+            frontier.close()
+    return pages_links
+
+def get_robots_txt(url):
+    """Fetches robots.txt and hands its Crawl-delay to the rate limiter. Returns None if there is none."""
     robots_url = urllib.parse.urljoin(url, '/robots.txt')
-    response = retry_request(robots_url)
-    robots_txt_content = response.text if response else 'No robots.txt found'
+    response = retry_request(robots_url, retries=1)
+    if not response:
+        return None
+    crawl_delay = parse_crawl_delay(response.text)
+    if crawl_delay is not None:
+        rate_limiter.set_crawl_delay(urllib.parse.urlparse(robots_url).netloc, crawl_delay)
+    return response.text
+
+@metrics.timed('analyze', analyzer='robots')
+def scrape_robots_txt(url):
+    robots_txt = get_robots_txt(url)
+    robots_txt_content = robots_txt if robots_txt is not None else 'No robots.txt found'
 
     print("\nRobots.txt:")
     print(robots_txt_content)
     
     return robots_txt_content
 
-def scrape_embedded_links(url):
-    response = retry_request(url)
-    if not response:
-        return []
+@metrics.timed('analyze', analyzer='embedded')
+def scrape_embedded_links(url):
+    page = get_page(url)
+    if not page:
+        return []
+
+    embedded_links = list(page.embedded_links)
+
+    print("\nEmbedded links:")
+    for link in embedded_links:
+        print(link)
+    
+    return embedded_links
+
+@metrics.timed('analyze', analyzer='metadata')
+def get_metadata(url):
+    page = get_page(url)
+    if not page:
+        return 'No title', 'No description'
+    
+    title = page.title if page.title else 'No title'
+    description_content = page.description if page.description else 'No description'
+
+    return title, description_content
+
+# Entity extraction: with RE2 every pattern is combined into one expression and a page is scanned once
+ENTITY_PATTERNS = {
+    # Matches start on a word boundary, so re does not rescan a long run of letters or digits from every
+    # position in it; the local part is bounded to its 64-character maximum, so text like "a.a.a...",
+    # which has a boundary every other character, costs at most 64 steps per position instead of the
+    # rest of the text. The phone number must also end on a boundary, so long digit runs are not cut up
+    'email': r'\b[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}',
+    'phone': r'(?:\+\d{1,3}[ .-]|\+)?(?:\(\d{1,4}\)[ .-]?)?\b\d(?:[ .-]?\d){6,13}\b',
+}
+ENTITY_SCHEMES = {'mailto': 'email', 'tel': 'phone'}
+ISO_DATE = re.compile(r'\d{4}-\d\d-\d\d')
+ENTITY_FILTERS = {'phone': lambda value: not ISO_DATE.fullmatch(value)}  # Drops matches that are not entities
+
+def _re2_module():
+    """Returns the google-re2 module if it is installed (pip install google-re2), else None."""
+    if importlib.util.find_spec('re2') is None:
+        return None
+    import re2
+    return re2 if hasattr(re2, 'Options') else None
+
+class EntityExtractor:
+    """Finds many entity types in as few scans of the text as possible.
+
+    Every pattern gets a precompiled pass of its own, so entity types whose matches overlap are all
+    found. With google-re2 installed, the patterns RE2 supports also go into an RE2 set that tells,
+    in one linear scan of a text, which of them match it at all; only those run their pass. Patterns
+    RE2 rejects (lookarounds, backreferences) and, without RE2, all patterns run on every text with
+    re, in ASCII mode like RE2, so both give the same entities. mailto: and tel: links give emails and
+    phone numbers directly.
+    """
+
+    def __init__(self, patterns=None):
+        self.patterns = dict(ENTITY_PATTERNS if patterns is None else patterns)
+        self.filtered = []  # (entity name, RE2 expression) at the index of its pattern in self.prefilter
+        self.passes = []  # (entity name, compiled expression) run on every text
+        self.prefilter = None
+        re2 = _re2_module()
+        if re2 is not None:
+            options = re2.Options()
+            options.log_errors = False
+            prefilter = re2.Set.SearchSet(options)
+            for name, pattern in self.patterns.items():
+                try:
+                    expression = re2.compile(pattern, options=options)
+                except re2.error:
+                    self.passes.append((name, re.compile(pattern, re.ASCII)))
+                    continue
+                prefilter.Add(pattern)
+                self.filtered.append((name, expression))
+            if self.filtered:
+                prefilter.Compile()
+                self.prefilter = prefilter
+        else:
+            self.passes = [(name, re.compile(pattern, re.ASCII)) for name, pattern in self.patterns.items()]
+
+    @property
+    def names(self):
+        return list(self.patterns)
+
+    def extract_text(self, texts, entities=None):
+        """Adds the entities found in an iterable of strings to entities (name -> set) and returns it."""
+        entities = entities if entities is not None else {name: set() for name in self.patterns}
+        for text in texts:
+            if not text:
+                continue
+            passes = self.passes
+            if self.prefilter is not None:
+                matched = self.prefilter.Match(text)
+                if matched:
+                    passes = [self.filtered[index] for index in matched] + passes
+            for name, expression in passes:
+                for match in expression.finditer(text):
+                    value = match.group().strip()
+                    if name not in ENTITY_FILTERS or ENTITY_FILTERS[name](value):
+                        entities[name].add(value)
+        return entities
+
+    def extract_page(self, page):
+        """Returns name -> sorted list of the entities in the visible text and attributes of a ParsedPage."""
+        entities = {name: set() for name in self.patterns}
+        self.extract_text(page.texts, entities)
+        attributes = []
+        for href in page.hrefs:
+            scheme, _, value = href.strip().partition(':')
+            name = ENTITY_SCHEMES.get(scheme.lower())
+            if name in entities and value:
+                entities[name].add(urllib.parse.unquote(value.split('?', 1)[0]).strip())
+            else:
+                attributes.append(href)
+        attributes.extend(image['alt'] for image in page.images)
+        attributes.extend(value for value in page.meta_tags.values() if isinstance(value, str))
+        attributes.extend(form['action'] for form in page.forms)
+        self.extract_text(attributes, entities)
+        return {name: sorted(values) for name, values in entities.items()}
+
+    def extract_pages(self, pages, workers=CRAWL_WORKERS):
+        """Batch mode: yields (url, entities) for ParsedPages or URLs, in order. URLs are fetched concurrently."""
+        def load(item):
+            return item if isinstance(item, ParsedPage) else get_page(item)
+
+        pages = list(pages)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for item, page in zip(pages, executor.map(load, pages)):
+                url = item if isinstance(item, str) else item.url
+                yield url, self.extract_page(page) if page else {name: [] for name in self.names}
+
+_entity_extractor = None
+_entity_extractor_lock = threading.Lock()
+
+def get_entity_extractor():
+    """Returns the extractor for ENTITY_PATTERNS, compiled once."""
+    global _entity_extractor
+    with _entity_extractor_lock:
+        if _entity_extractor is None or _entity_extractor.patterns != ENTITY_PATTERNS:
+            _entity_extractor = EntityExtractor()
+        return _entity_extractor
+
+def register_entity_pattern(name, pattern):
+    """Adds (or replaces) an entity type found by get_content_analysis and extract_entities."""
+    re.compile(pattern)
+    ENTITY_PATTERNS[name] = pattern
+
+_page_entities = weakref.WeakKeyDictionary()
+
+def extract_entities(page):
+    """Returns every entity type found on a ParsedPage, see EntityExtractor. Each page is scanned once."""
+    extractor = get_entity_extractor()
+    with _entity_extractor_lock:
+        cached = _page_entities.get(page)
+    if cached is not None and cached[0] is extractor:
+        return cached[1]
+    entities = extractor.extract_page(page)
+    with _entity_extractor_lock:
+        _page_entities[page] = (extractor, entities)
+    return entities
+
+@metrics.timed('analyze', analyzer='content')
+def get_content_analysis(url):
+    page = get_page(url)
+    if not page:
+        return {}, '', {}, [], [], [], [], {}, [], [], [], [], set(), set()
+
+    main_content = page.main_content
+
+    # Email addresses and phone numbers, from the visible text and the mailto:/tel: links
+    entities = extract_entities(page)
+    email_addresses = set(entities.get('email', []))
+    phone_numbers = set(entities.get('phone', []))
+
+    return (page.headers, main_content, page.lists, page.blockquotes, page.tables, page.links, page.images,
+            page.meta_tags, page.scripts, page.forms, page.iframes, page.comments, email_addresses, phone_numbers)
+
+@skip_unchanged('content')
+def content_analysis_record(url):
+    (headers, content, lists, blockquotes, tables, links, images, meta_tags, scripts, forms,
+     iframes, comments, email_addresses, phone_numbers) = get_content_analysis(url)
+    page = get_page(url)
+    return {
+        'headers': headers,
+        'content': content,
+        'lists': lists,
+        'blockquotes': blockquotes,
+        'tables': tables,
+        'links': links,
+        'images': images,
+        'meta_tags': meta_tags,
+        'scripts': scripts,
+        'forms': forms,
+        'iframes': iframes,
+        'comments': comments,
+        'email_addresses': email_addresses,
+        'phone_numbers': phone_numbers,
+        'entities': extract_entities(page) if page else {},
+        'structured_data': extract_structured_data(page) if page else {}
+    }
+
+# Structured data: typed tables, JSON-LD, microdata and OpenGraph
+NUMBER_VALUE = re.compile(r'(?P<sign>[-+\u2212]?)\s*[$\u20ac\u00a3\u00a5\u20b9]?\s*(?P<number>\d{1,3}(?:,\d{3})+|\d+)'
+                          r'(?P<fraction>\.\d+)?\s*(?:%|[$\u20ac\u00a3\u00a5\u20b9])?')
+JSON_LD_WRAPPER = re.compile(r'^\s*(?://\s*)?(?:<!--|<!\[CDATA\[)|(?://\s*)?(?:-->|\]\]>)\s*$')
+
+def parse_number(text):
+    """Returns the number in a cell such as '1,200', '$12.50', '-3' or '15%' (as 15), or None.
+
+    Values with leading zeros ('0012') are identifiers, not numbers.
+    """
+    match = NUMBER_VALUE.fullmatch(text.strip())
+    if match is None or (len(match['number']) > 1 and match['number'].startswith('0')):
+        return None
+    number = match['number'].replace(',', '')
+    sign = -1 if match['sign'] in ('-', '\u2212') else 1
+    return sign * (float(number + match['fraction']) if match['fraction'] else int(number))
+
+def type_column(values):
+    """Returns a column with one type: numbers when every value is a number or parse_number reads it,
+    text when the values are mixed. Empty strings become None, lists and dicts JSON text."""
+    values = [None if value == '' else value for value in values]
+    present = [value for value in values if value is not None]
+    if any(isinstance(value, (dict, list)) for value in present):
+        return [None if value is None else json.dumps(value, ensure_ascii=False, default=_json_default)
+                for value in values]
+    if all(isinstance(value, bool) for value in present):
+        return values
+    numbers = [value if isinstance(value, (int, float)) and not isinstance(value, bool)
+               else parse_number(value) if isinstance(value, str) else None for value in values]
+    if present and all(number is not None for number, value in zip(numbers, values) if value is not None):
+        if any(isinstance(number, float) for number in numbers):
+            return [None if number is None else float(number) for number in numbers]
+        return numbers
+    if len({type(value) for value in present}) > 1:
+        return [None if value is None else str(value) for value in values]
+    return values
+
+def table_records(table):
+    """Returns the rows of a table (see build_table) as dicts keyed by header, typed column by column."""
+    columns = [type_column(list(column)) for column in zip(*table['rows'])] if table['rows'] else []
+    return [dict(zip(table['headers'], values)) for values in zip(*columns)]
+
+def parse_json_ld(blocks):
+    """Parses JSON-LD script contents into a list of items, with @graph lists flattened.
+    Blocks that are not valid JSON are skipped and counted in the json_ld_errors metric."""
+    items = []
+    for block in blocks:
+        try:
+            data = json.loads(JSON_LD_WRAPPER.sub('', block or ''), strict=False)
+        except ValueError:
+            metrics.count('json_ld_errors')
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict) and isinstance(item.get('@graph'), list):
+                items.extend(entry for entry in item['@graph'] if isinstance(entry, dict))
+            elif isinstance(item, dict):
+                items.append(item)
+    return items
+
+def get_opengraph(page):
+    """Returns the <meta property> values of a page (og:, product:, article:, ...); repeated properties give lists."""
+    properties = {}
+    for name, content in page.meta_properties:
+        if name in properties:
+            previous = properties[name]
+            properties[name] = (previous if isinstance(previous, list) else [previous]) + [content]
+        else:
+            properties[name] = content
+    return properties
+
+def extract_structured_data(page):
+    """Returns the typed tables, JSON-LD items, microdata items and OpenGraph properties of a ParsedPage."""
+    return {
+        'tables': [{'caption': table['caption'], 'headers': table['headers'], 'records': table_records(table)}
+                   for table in page.tables],
+        'json_ld': parse_json_ld(page.json_ld),
+        'microdata': page.microdata,
+        'opengraph': get_opengraph(page),
+    }
+
+# Language detection on the visible text of pages
+LANGUAGE_SAMPLE_CHARS = 1000  # Characters of visible text handed to the detector
+LANGUAGE_SAMPLE_WINDOWS = 4  # The sample is taken from this many places spread over the text
+LANGUAGE_SEED = 0  # langdetect is randomized: a fixed seed gives the same answer on every run
+LANGUAGE_CACHE_SIZE = 10000
+LANGUAGE_BATCH_PROCESSES = None  # None uses one process per CPU core
+LANGUAGE_INLINE_BATCH = 32  # Smaller batches are detected in this process
+
+_language_cache = OrderedDict()
+_language_cache_lock = threading.Lock()
+
+def language_sample(text, size=LANGUAGE_SAMPLE_CHARS, windows=LANGUAGE_SAMPLE_WINDOWS):
+    """Returns at most `size` characters of a text, from `windows` evenly spaced places, so a long page
+    is judged on more than its navigation and the detection time does not grow with the page."""
+    text = ' '.join(text.split())
+    if len(text) <= size:
+        return text
+    width = size // windows
+    step = (len(text) - width) / max(windows - 1, 1)
+    return ' '.join(text[round(i * step):round(i * step) + width] for i in range(windows))
+
+def _detect_sample(sample, seed):
+    from langdetect import DetectorFactory, detect
+    from langdetect.lang_detect_exception import LangDetectException
+    DetectorFactory.seed = seed
+    try:
+        return detect(sample)
+    except LangDetectException:
+        # No letters to go by (empty page, numbers only)
+        return 'unknown'
+
+def detect_languages(pages, processes=LANGUAGE_BATCH_PROCESSES):
+    """Returns the language code of every page (a ParsedPage or a text), in order.
+
+    Each page is reduced to a bounded sample of its visible text (language_sample). Results are
+    memoized by a hash of the sample, so identical texts are detected once per run. Batches of at
+    least LANGUAGE_INLINE_BATCH new samples are spread over a pool of processes.
+    """
+    samples = [language_sample(page if isinstance(page, str) else page.text) for page in pages]
+    keys = [hashlib.blake2b(sample.encode('utf-8'), digest_size=16).digest() for sample in samples]
+    languages = {}
+    with _language_cache_lock:
+        for key in keys:
+            if key in _language_cache:
+                _language_cache.move_to_end(key)
+                languages[key] = _language_cache[key]
+                metrics.count('cache_hits', cache='language')
+    missing = {key: sample for key, sample in zip(keys, samples) if key not in languages}
+    if missing:
+        processes = processes or os.cpu_count() or 1
+        if processes == 1 or len(missing) < LANGUAGE_INLINE_BATCH:
+            detected = [_detect_sample(sample, LANGUAGE_SEED) for sample in missing.values()]
+        else:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+                detected = list(executor.map(_detect_sample, missing.values(), itertools.repeat(LANGUAGE_SEED),
+                                             chunksize=max(1, len(missing) // (processes * 4))))
+        with _language_cache_lock:
+            for key, language in zip(missing, detected):
+                languages[key] = _language_cache[key] = language
+            while len(_language_cache) > LANGUAGE_CACHE_SIZE:
+                _language_cache.popitem(last=False)
+    return [languages[key] for key in keys]
+
+@metrics.timed('analyze', analyzer='language')
+@skip_unchanged('language')
+def get_language(url):
+    """Returns the language code of a page's visible text, or 'unknown'."""
+    page = get_page(url)
+    if not page:
+        return 'unknown'
+    return detect_languages([page], processes=1)[0]
+
+# Multi-process sharded crawling: parsing is CPU-bound, so large crawls are spread over processes
+SHARD_PROCESSES = None  # None starts one process per CPU core
+SHARD_THREADS = 8  # Fetch and parse threads inside each shard process
+PAGE_FEATURES = ('embedded', 'metadata', 'content', 'language')  # Features the sharded crawler runs on every page
+
+def analyze_page(url, features):
+    """Runs the page-level features on one URL and returns its record.
+
+    With change detection enabled, a page that duplicates an earlier page of the run is not
+    analyzed: its record only names that page under 'duplicate_of'.
+    """
+    record = {'url': url}
+    duplicate_of = find_duplicate(url)
+    if duplicate_of:
+        record['duplicate_of'] = duplicate_of
+        return record
+    if 'embedded' in features:
+        page = get_page(url)
+        record['embedded_links'] = list(page.embedded_links) if page else []
+    if 'metadata' in features:
+        title, description = get_metadata(url)
+        record['metadata'] = {'title': title, 'description': description}
+    if 'content' in features:
+        record['content_analysis'] = content_analysis_record(url)
+    if 'language' in features:
+        record['language'] = get_language(url)
+    return record
+
+def shard_for(url, shards, shard_by='host'):
+    """Returns the shard that owns a URL. Sharding by host keeps every host in one process, and so
+    under one rate limiter; sharding by URL spreads a single site over every process."""
+    key = urllib.parse.urlparse(url).netloc if shard_by == 'host' else url
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big') % shards
+
+class PageCrawler:
+    """Fetches one page at a time for the crawl workers (shard processes and work queue workers):
+    returns its same-host links and its record. Each host's robots.txt is read once, before its first
+    page, and at most per_host requests per host are in flight. Safe to use from many threads."""
+
+    def __init__(self, features, per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY):
+        self.features = features
+        self.per_host = per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.robots_read = {}  # host -> Event set once its robots.txt has been read
+        self.host_slots = {}
+
+    def crawl(self, page_url):
+        host = urllib.parse.urlparse(page_url).netloc
+        with self.lock:
+            robots_read = self.robots_read.get(host)
+            first_of_host = robots_read is None
+            if first_of_host:
+                robots_read = self.robots_read[host] = threading.Event()
+            slot = self.host_slots.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        if first_of_host:
+            # Fetched outside the lock: only the pages of this host wait for it
+            try:
+                if self.delay is not None:
+                    rate_limiter.set_politeness(host, self.delay)
+                get_robots_txt(page_url)
+            finally:
+                robots_read.set()
+        else:
+            robots_read.wait()
+        with slot:
+            logging.info(f"Scraping page links from {page_url}")
+            # Link targets that are not HTML are not downloaded at all
+            response = retry_request(page_url, content_types=HTML_CONTENT_TYPES, keep_rejected=True)
+            if response is not None and getattr(response, 'rejected', None):
+                return [], {'url': page_url, 'skipped': response.rejected}
+            if not response:
+                logging.error(f"Failed to retrieve {page_url}")
+                return [], {'url': page_url, 'error': 'unreachable'}
+            links = extract_same_domain_links(page_url, response, host)
+            record = analyze_page(page_url, self.features)
+        return links, record
+
+def _shard_worker(inbox, outbox, features, threads, per_host, delay, parser_backend, log_file, entity_patterns,
+                  change_detection):
+    """Body of a shard process: fetches, parses and analyzes the URLs it is sent until it receives None.
+
+    Links are deduplicated locally before they are reported, the coordinator holds the merged seen-set.
+    """
+    if log_file:
+        logging.basicConfig(filename=log_file, level=logging.INFO)
+    set_parser_backend(parser_backend)
+    ENTITY_PATTERNS.clear()
+    ENTITY_PATTERNS.update(entity_patterns)
+    if change_detection:
+        enable_change_detection(*change_detection)
+    crawler = PageCrawler(features, per_host, delay)
+    reported = SeenSet()
+    reported_lock = threading.Lock()
+
+    def crawl_one(page_url):
+        links, record = crawler.crawl(page_url)
+        new_links = []
+        with reported_lock:
+            for link_url in links:
+                if link_url not in reported:
+                    reported.add(link_url)
+                    new_links.append(link_url)
+        return new_links, record
+
+    def run():
+        while True:
+            page_url = inbox.get()
+            if page_url is None:
+                # Wake the next thread of this process too
+                inbox.put(None)
+                return
+            try:
+                links, record = crawl_one(page_url)
+            except Exception as e:
+                logging.error(f"Crawling {page_url} failed: {e}", exc_info=True)
+                links, record = [], {'url': page_url, 'error': str(e)}
+            outbox.put((page_url, links, record))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(run) for _ in range(threads)]:
+            future.result()
+    disable_change_detection()
+    # The coordinator merges the metrics of every shard into its own
+    outbox.put((None, None, metrics.snapshot()))
+
+def crawl_sharded(start_urls, features=(), sink=None, processes=SHARD_PROCESSES, threads=SHARD_THREADS,
+                  per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY, max_pages=None, bloom=False, shard_by='host'):
+    """Crawls the sites of the start URLs with a pool of processes, each running its own fetch and parse loop.
+
+    URLs are sent to the shard that owns them (see shard_for). This process is the coordinator: it
+    merges the links the shards report into one seen-set, hands the new ones out and writes the record
+    of every page (the PAGE_FEATURES in features) to sink. Sharding by URL lets a single site use every
+    core, but each process keeps its own rate limiter, so `delay` is then multiplied by the number of
+    processes. Returns the discovered links and the number of pages that could not be crawled.
+    """
+    if isinstance(start_urls, str):
+        start_urls = [start_urls]
+    features = list(features)
+    unknown = set(features) - set(PAGE_FEATURES)
+    if unknown:
+        raise ValueError(f"Features {sorted(unknown)} cannot run per page. Choose from {list(PAGE_FEATURES)}")
+    if shard_by not in ('host', 'url'):
+        raise ValueError(f"Unknown shard_by '{shard_by}'. Choose 'host' or 'url'")
+    processes = processes or os.cpu_count() or 1
+    if shard_by == 'url' and delay is not None:
+        delay *= processes
+
+    # Spawned processes start clean instead of inheriting the parent's threads, sockets and SQLite handles
+    context = multiprocessing.get_context('spawn')
+    # A spawned process starts without logging configured: log to the same file as this one
+    log_file = next((handler.baseFilename for handler in logging.getLogger().handlers
+                     if isinstance(handler, logging.FileHandler)), None)
+    # Each shard opens the change detection store itself; hosts stay in one shard, so do their near-duplicates
+    tracker = _change_tracker
+    change_detection = (tracker.path, tracker.distance, tracker.max_age) if tracker is not None else None
+    inboxes = [context.Queue() for _ in range(processes)]
+    outbox = context.Queue()
+    shards = [context.Process(target=_shard_worker, daemon=True,
+                              args=(inbox, outbox, features, threads, per_host, delay, get_parser_backend(),
+                                    log_file, dict(ENTITY_PATTERNS), change_detection))
+              for inbox in inboxes]
+    for shard in shards:
+        shard.start()
+    logging.info(f"Crawling {len(start_urls)} sites with {processes} processes of {threads} threads")
+
+    seen = make_seen_set(bloom)
+    domains = set()
+    found_links = []
+    failures = 0
+    outstanding = 0
+
+    def dispatch(url):
+        nonlocal outstanding
+        seen.add(url)
+        inboxes[shard_for(url, processes, shard_by)].put(url)
+        outstanding += 1
+
+    for url in start_urls:
+        url = canonicalize_url(url) or url
+        domains.add(urllib.parse.urlparse(url).netloc)
+        if url not in seen:
+            dispatch(url)
+    try:
+        while outstanding:
+            try:
+                page_url, links, record = outbox.get(timeout=1)
+            except queue.Empty:
+                if not all(shard.is_alive() for shard in shards):
+                    raise RuntimeError("A crawl shard process exited unexpectedly")
+                continue
+            outstanding -= 1
+            if 'error' in record:
+                failures += 1
+            if sink is not None:
+                sink.write(record)
+            for link_url in links:
+                if max_pages is not None and len(found_links) >= max_pages:
+                    break
+                if urllib.parse.urlparse(link_url).netloc in domains and link_url not in seen:
+                    found_links.append(link_url)
+                    dispatch(link_url)
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        reported = 0
+        while reported < processes and any(shard.is_alive() for shard in shards):
+            try:
+                page_url, _, snapshot = outbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            if page_url is None:
+                metrics.merge(snapshot)
+                reported += 1
+        for shard in shards:
+            shard.join(timeout=5)
+            if shard.is_alive():
+                shard.terminate()
+    return found_links, failures
+
+# Distributed crawling: a coordinator leases batches of URLs to worker processes on any number of machines
+QUEUE_ADDRESS = ('127.0.0.1', 5577)
+QUEUE_BATCH_SIZE = 8  # URLs a worker leases at a time
+QUEUE_LEASE_SECONDS = 60  # URLs a worker neither finishes nor renews in time are handed to another worker
+QUEUE_MAX_ATTEMPTS = 3  # Deliveries of one URL before it is given up
+QUEUE_POLL_INTERVAL = 0.5
+QUEUE_CONNECT_TIMEOUT = 30  # Seconds a worker keeps trying to reach a coordinator that is still starting
+QUEUE_SHUTDOWN_GRACE = 5  # Seconds the coordinator keeps answering after the crawl so workers see that it is over
+
+class WorkQueue:
+    """Leased URL queue of a distributed crawl, kept in SQLite so a restarted coordinator resumes it.
+
+    Every URL ever queued is one row. Workers lease batches of pending URLs and report each page's
+    links and record with complete(). A lease that runs out (its worker died or hung) puts the URL
+    back to pending, until it has been delivered QUEUE_MAX_ATTEMPTS times; the first result reported
+    for a URL wins. Records wait in memory until the coordinator takes them with take_results().
+    """
+
+    PENDING, LEASED, DONE, FAILED = 0, 1, 2, 3
+
+    def __init__(self, path, settings=None, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS,
+                 max_pages=None):
+        self.path = path
+        self.settings = dict(settings or {}, lease_seconds=lease_seconds)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_pages = max_pages
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tasks (fingerprint INTEGER NOT NULL UNIQUE, '
+                                'url TEXT NOT NULL, state INTEGER NOT NULL, owner TEXT, expires REAL, '
+                                'attempts INTEGER NOT NULL DEFAULT 0)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, expires)')
+        # Leases of a previous coordinator died with it
+        self.connection.execute('UPDATE tasks SET state = ?, owner = NULL WHERE state = ?', (self.PENDING, self.LEASED))
+        self.connection.commit()
+        self.queued = self.connection.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        self.results = deque()
+        self.workers = {}
+        self.worker_metrics = []
+
+    def get_settings(self):
+        """Returns what every worker needs to know about the crawl: features, politeness and lease length."""
+        return self.settings
+
+    def _add(self, urls):
+        added = 0
+        for url in urls:
+            if self.max_pages is not None and self.queued >= self.max_pages:
+                break
+            cursor = self.connection.execute('INSERT OR IGNORE INTO tasks (fingerprint, url, state) VALUES (?, ?, ?)',
+                                             (url_fingerprint(url), url, self.PENDING))
+            self.queued += cursor.rowcount
+            added += cursor.rowcount
+        return added
+
+    def add(self, urls):
+        """Queues the URLs that were never seen. Returns how many were new."""
+        with self.lock:
+            added = self._add(urls)
+            self.connection.commit()
+            return added
+
+    def _expire(self, now):
+        rows = self.connection.execute('SELECT fingerprint, url, owner, attempts FROM tasks WHERE state = ? AND expires < ?',
+                                       (self.LEASED, now)).fetchall()
+        for fingerprint, url, owner, attempts in rows:
+            logging.warning(f"Lease of {url} by worker {owner} expired after delivery {attempts}")
+            metrics.count('leases_expired')
+            if attempts >= self.max_attempts:
+                self.connection.execute('UPDATE tasks SET state = ?, owner = NULL WHERE fingerprint = ?',
+                                        (self.FAILED, fingerprint))
+                self.results.append({'url': url, 'error': f'lease expired {attempts} times'})
+            else:
+                self.connection.execute('UPDATE tasks SET state = ?, owner = NULL WHERE fingerprint = ?',
+                                        (self.PENDING, fingerprint))
+
+    def _unfinished(self):
+        return self.connection.execute('SELECT 1 FROM tasks WHERE state IN (?, ?) LIMIT 1',
+                                       (self.PENDING, self.LEASED)).fetchone() is not None
+
+    def lease(self, worker, count=QUEUE_BATCH_SIZE):
+        """Leases up to count pending URLs to worker. Returns them, an empty list when none is free
+        right now, or None once the crawl is over."""
+        with self.lock:
+            now = time.time()
+            self.workers[worker] = now
+            self._expire(now)
+            rows = self.connection.execute('SELECT fingerprint, url FROM tasks WHERE state = ? ORDER BY rowid LIMIT ?',
+                                           (self.PENDING, count)).fetchall()
+            self.connection.executemany('UPDATE tasks SET state = ?, owner = ?, expires = ?, attempts = attempts + 1 '
+                                        'WHERE fingerprint = ?',
+                                        [(self.LEASED, worker, now + self.lease_seconds, fingerprint)
+                                         for fingerprint, _ in rows])
+            self.connection.commit()
+            if not rows and not self._unfinished():
+                return None
+            metrics.count('urls_leased', len(rows))
+            return [url for _, url in rows]
+
+    def renew(self, worker):
+        """Extends every lease held by worker, which is still busy with its batch."""
+        with self.lock:
+            now = time.time()
+            self.workers[worker] = now
+            self.connection.execute('UPDATE tasks SET expires = ? WHERE state = ? AND owner = ?',
+                                    (now + self.lease_seconds, self.LEASED, worker))
+            self.connection.commit()
+
+    def complete(self, worker, url, links, record):
+        """Stores the result of a page and queues its new links. Returns False for a URL that
+        another worker already completed, whose result is dropped."""
+        with self.lock:
+            self.workers[worker] = time.time()
+            cursor = self.connection.execute('UPDATE tasks SET state = ?, owner = NULL WHERE fingerprint = ? '
+                                             'AND state IN (?, ?)',
+                                             (self.DONE, url_fingerprint(url), self.PENDING, self.LEASED))
+            if not cursor.rowcount:
+                metrics.count('duplicate_results')
+                return False
+            self._add(links)
+            self.connection.commit()
+            self.results.append(record)
+            return True
+
+    def report_metrics(self, worker, snapshot):
+        with self.lock:
+            self.workers.pop(worker, None)
+            self.worker_metrics.append(snapshot)
+
+    def take_results(self):
+        """Returns the records reported since the last call."""
+        with self.lock:
+            results = list(self.results)
+            self.results.clear()
+            return results
+
+    def active_workers(self):
+        """Returns the workers that talked to the queue and have not reported their metrics yet."""
+        with self.lock:
+            return list(self.workers)
+
+    def counts(self):
+        with self.lock:
+            counts = dict(self.connection.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall())
+        return {name: counts.get(state, 0) for name, state in
+                (('pending', self.PENDING), ('leased', self.LEASED), ('done', self.DONE), ('failed', self.FAILED))}
+
+    def is_finished(self):
+        """True once every queued URL is done or failed. Expired leases are handed back first."""
+        with self.lock:
+            self._expire(time.time())
+            self.connection.commit()
+            return self.queued > 0 and not self._unfinished()
+
+    def reset(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM tasks')
+            self.connection.commit()
+            self.queued = 0
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+@functools.lru_cache(maxsize=None)
+def _work_queue_manager():
+    """Returns the manager class workers use to reach the coordinator's WorkQueue over TCP.
+    multiprocessing.managers is imported on first use only, it is slow to import."""
+    from multiprocessing.managers import BaseManager
+
+    class WorkQueueManager(BaseManager):
+        pass
+
+    WorkQueueManager.register('work_queue')
+    return WorkQueueManager
+
+def _accept_workers(server):
+    """Accept loop of the coordinator's queue server, stopped by server.stop_event. Used instead of
+    Server.serve_forever, which resets sys.stdout when it returns and spins once its listener is closed."""
+    while not server.stop_event.is_set():
+        try:
+            connection = server.listener.accept()
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+            if not server.stop_event.is_set():
+                logging.warning(f"Rejected a connection to the work queue: {e}")
+            continue
+        threading.Thread(target=server.handle_request, args=(connection,), daemon=True).start()
+    server.listener.close()
+
+def parse_queue_address(address):
+    """Returns the (host, port) of a 'host:port' string. A bare port listens on or connects to localhost."""
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(':')
+    if not port.isdigit():
+        raise ValueError(f"Expected HOST:PORT, got {address!r}")
+    return host.strip('[]') or QUEUE_ADDRESS[0], int(port)
+
+def serve_work_queue(start_urls, features=(), sink=None, address=QUEUE_ADDRESS, authkey=None, state_path=':memory:',
+                     workers=0, threads=SHARD_THREADS, per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY, max_pages=None,
+                     lease_seconds=QUEUE_LEASE_SECONDS):
+    """Runs the coordinator of a distributed crawl of the start URLs' sites until every page is done.
+
+    The queue is served over TCP at address to workers started with run_worker, here or on other
+    machines, which must know authkey. `workers` local worker processes are started as well. The
+    record of every page (the PAGE_FEATURES in features) is written to sink as workers report it.
+    With a state_path file a coordinator that is restarted resumes the crawl where it stopped.
+    Each worker keeps its own rate limiter, so `delay` applies per worker.
+    Returns the number of pages crawled and the number that failed.
+    """
+    if isinstance(start_urls, str):
+        start_urls = [start_urls]
+    features = list(features)
+    unknown = set(features) - set(PAGE_FEATURES)
+    if unknown:
+        raise ValueError(f"Features {sorted(unknown)} cannot run per page. Choose from {list(PAGE_FEATURES)}")
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    if not authkey:
+        raise ValueError("A distributed crawl needs an authkey shared by the coordinator and its workers")
+    settings = {'features': features, 'per_host': per_host, 'delay': delay, 'entity_patterns': dict(ENTITY_PATTERNS)}
+    work_queue = WorkQueue(state_path, settings, lease_seconds=lease_seconds, max_pages=max_pages)
+    if work_queue.is_finished():
+        work_queue.reset()
+    elif work_queue.queued:
+        logging.info(f"Resuming the distributed crawl in {state_path}: {work_queue.counts()}")
+    work_queue.add([canonicalize_url(url) or url for url in start_urls])
+
+    class CoordinatorManager(_work_queue_manager()):
+        pass
+
+    CoordinatorManager.register('work_queue', callable=lambda: work_queue)
+    server = CoordinatorManager(address=parse_queue_address(address), authkey=authkey).get_server()
+    server.stop_event = threading.Event()
+    accepter = threading.Thread(target=_accept_workers, args=(server,), name='work-queue', daemon=True)
+    accepter.start()
+    logging.info(f"Serving the work queue of {len(start_urls)} sites at {server.address}")
+
+    context = multiprocessing.get_context('spawn')
+    log_file = next((handler.baseFilename for handler in logging.getLogger().handlers
+                     if isinstance(handler, logging.FileHandler)), None)
+    local_workers = [context.Process(target=run_worker, daemon=True, args=(server.address, authkey),
+                                     kwargs={'threads': threads, 'parser_backend': get_parser_backend(),
+                                             'log_file': log_file})
+                     for _ in range(workers)]
+    for process in local_workers:
+        process.start()
+
+    pages = failures = 0
+
+    def write_results():
+        nonlocal pages, failures
+        for record in work_queue.take_results():
+            pages += 1
+            if 'error' in record:
+                failures += 1
+            if sink is not None:
+                sink.write(record)
+
+    try:
+        while not work_queue.is_finished():
+            write_results()
+            time.sleep(QUEUE_POLL_INTERVAL)
+        write_results()
+        # Workers learn that the crawl is over on their next lease and report their metrics
+        deadline = time.monotonic() + QUEUE_SHUTDOWN_GRACE
+        while work_queue.active_workers() and time.monotonic() < deadline:
+            time.sleep(QUEUE_POLL_INTERVAL)
+    finally:
+        server.stop_event.set()
+        # Wake the accept loop so it sees the stop and closes the listener
+        with contextlib.suppress(OSError):
+            socket.create_connection(server.address, timeout=1).close()
+        accepter.join(timeout=5)
+        for process in local_workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for snapshot in work_queue.worker_metrics:
+            metrics.merge(snapshot)
+        logging.info(f"Distributed crawl finished: {work_queue.counts()}")
+        work_queue.close()
+    return pages, failures
+
+def run_worker(address, authkey, threads=SHARD_THREADS, batch_size=QUEUE_BATCH_SIZE, worker_id=None,
+               parser_backend=None, log_file=None, connect_timeout=QUEUE_CONNECT_TIMEOUT):
+    """Runs a worker of the distributed crawl served at address until the crawl is over.
+
+    The worker leases batches of URLs, crawls them on `threads` threads with the coordinator's
+    settings and reports every page as soon as it is done. Its leases are renewed while it works,
+    so only a worker that dies or hangs loses its URLs to another one. Returns the pages crawled.
+    """
+    if log_file:
+        logging.basicConfig(filename=log_file, level=logging.INFO)
+    if parser_backend:
+        set_parser_backend(parser_backend)
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    manager = _work_queue_manager()(address=parse_queue_address(address), authkey=authkey)
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            manager.connect()
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(QUEUE_POLL_INTERVAL)
+    work_queue = manager.work_queue()
+    settings = work_queue.get_settings()
+    ENTITY_PATTERNS.clear()
+    ENTITY_PATTERNS.update(settings['entity_patterns'])
+    crawler = PageCrawler(settings['features'], settings['per_host'], settings['delay'])
+    logging.info(f"Worker {worker_id} crawling for the coordinator at {address}")
+
+    stop = threading.Event()
+
+    def renew_leases():
+        while not stop.wait(settings['lease_seconds'] / 3):
+            try:
+                work_queue.renew(worker_id)
+            except (EOFError, OSError):
+                return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-    embedded_links = []
-    for tag in soup.find_all(lambda tag: tag.has_attr('src')):
-        embedded_link = tag['src']
-        embedded_links.append(embedded_link)
+    def crawl_one(page_url):
+        try:
+            return crawler.crawl(page_url)
+        except Exception as e:
+            logging.error(f"Crawling {page_url} failed: {e}", exc_info=True)
+            return [], {'url': page_url, 'error': str(e)}
 
-    print("\nEmbedded links:")
-    for link in embedded_links:
-        print(link)
-    
-    return embedded_links
+    threading.Thread(target=renew_leases, name='lease-renewal', daemon=True).start()
+    reported = SeenSet()
+    in_flight = {}
+    pages = 0
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            while True:
+                if len(in_flight) < threads:
+                    urls = work_queue.lease(worker_id, batch_size)
+                    if urls is None and not in_flight:
+                        break
+                    for url in urls or ():
+                        in_flight[executor.submit(crawl_one, url)] = url
+                if not in_flight:
+                    time.sleep(QUEUE_POLL_INTERVAL)
+                    continue
+                done, _ = wait(in_flight, timeout=QUEUE_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_url = in_flight.pop(future)
+                    links, record = future.result()
+                    # Links this worker already reported are not sent again, the queue holds the merged seen-set
+                    new_links = [link_url for link_url in links if link_url not in reported]
+                    for link_url in new_links:
+                        reported.add(link_url)
+                    work_queue.complete(worker_id, page_url, new_links, record)
+                    pages += 1
+        work_queue.report_metrics(worker_id, metrics.snapshot())
+    except (EOFError, OSError) as e:
+        # The coordinator stopped; whatever this worker still held is leased again when it restarts
+        logging.warning(f"Worker {worker_id} lost the coordinator at {address}: {e}")
+    finally:
+        stop.set()
+    logging.info(f"Worker {worker_id} finished after {pages} pages")
+    return pages
 
-def get_metadata(url):
-    response = retry_request(url)
-    if not response:
-        return 'No title', 'No description'
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    title = soup.title.string if soup.title else 'No title'
-    description = soup.find('meta', attrs={'name': 'description'})
-    description_content = description['content'] if description else 'No description'
+# Concurrent link checker
+LINK_CHECK_WORKERS = 32
+LINK_CHECK_PER_HOST = 4
+HEAD_FALLBACK_STATUSES = {400, 403, 404, 405, 501}  # Servers that reject or mishandle HEAD get a streamed GET
 
-    return title, description_content
+_link_status_cache = {}
+_link_status_lock = threading.Lock()
+_link_host_slots = {}
 
-def get_content_analysis(url):
-    response = retry_request(url)
-    if not response:
-        return {}, '', [], [], [], [], [], [], [], [], [], [], []
+def normalize_link(page_url, href):
+    """Resolves a link against its page and drops the fragment. Returns None for non-HTTP links."""
+    link_url, _ = urllib.parse.urldefrag(urllib.parse.urljoin(page_url, href.strip()))
+    if urllib.parse.urlparse(link_url).scheme not in ('http', 'https'):
+        return None
+    return link_url
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+def clear_link_status_cache():
+    with _link_status_lock:
+        _link_status_cache.clear()
 
-    # Headers
-    headers = {
-        'h1': [h1.get_text() for h1 in soup.find_all('h1')],
-        'h2': [h2.get_text() for h2 in soup.find_all('h2')],
-        'h3': [h3.get_text() for h3 in soup.find_all('h3')],
-        'h4': [h4.get_text() for h4 in soup.find_all('h4')],
-        'h5': [h5.get_text() for h5 in soup.find_all('h5')],
-        'h6': [h6.get_text() for h6 in soup.find_all('h6')]
-    }
+def _host_slot(host, per_host):
+    with _link_status_lock:
+        slot = _link_host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(per_host)
+            _link_host_slots[host] = slot
+        return slot
 
-    # Main Content
-    main_content = ' '.join(p.get_text() for p in soup.find_all('p'))
+def _probe(url, method):
+    response = fetch_response(url, method=method, stream=True)
+    if response is None:
+        return None, None
+    # Only the headers are needed: release the connection without reading the body
+    response.close()
+    return response, response.elapsed.total_seconds()
 
-    # Lists
-    lists = {
-        'ul': [li.get_text() for ul in soup.find_all('ul') for li in ul.find_all('li')],
-        'ol': [li.get_text() for ol in soup.find_all('ol') for li in ol.find_all('li')]
-    }
+def probe_link(url, retries=2, delay=1):
+    """Checks one URL with HEAD, falling back to a streamed GET, and returns its status and latency."""
+    host = urllib.parse.urlparse(url).netloc
+    result = {'url': url, 'status': None, 'latency': None, 'method': 'HEAD', 'ok': False}
+    for attempt in range(retries):
+        response, latency = _probe(url, 'HEAD')
+        result['method'] = 'HEAD'
+        if response is None or response.status_code in HEAD_FALLBACK_STATUSES:
+            response, latency = _probe(url, 'GET')
+            result['method'] = 'GET'
+        result['latency'] = latency
+        if response is not None:
+            result['status'] = response.status_code
+            result['ok'] = response.ok
+            if response.status_code not in RETRY_STATUSES:
+                break
+        if attempt + 1 < retries:
+            rate_limiter.backoff(host, delay * 2 ** attempt)
+    return result
 
-    # Blockquotes
-    blockquotes = [blockquote.get_text() for blockquote in soup.find_all('blockquote')]
+def probe_links(urls, workers=LINK_CHECK_WORKERS, per_host=LINK_CHECK_PER_HOST):
+    """Checks many URLs concurrently. Each URL is checked once per run, later calls reuse the cached result."""
+    results = {}
+    pending = []
+    with _link_status_lock:
+        for url in dict.fromkeys(urls):
+            if url in _link_status_cache:
+                results[url] = _link_status_cache[url]
+            else:
+                pending.append(url)
 
-    # Tables
-    tables = []
-    for table in soup.find_all('table'):
-        table_data = {
-            'headers': [th.get_text() for th in table.find_all('th')],
-            'rows': [[td.get_text() for td in row.find_all('td')] for row in table.find_all('tr')]
-        }
-        tables.append(table_data)
+    def check(url):
+        with _host_slot(urllib.parse.urlparse(url).netloc, per_host):
+            return probe_link(url)
 
-    # Links
-    links = [{'text': a.get_text(), 'url': a.get('href')} for a in soup.find_all('a', href=True)]
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            for result in executor.map(check, pending):
+                results[result['url']] = result
+                with _link_status_lock:
+                    _link_status_cache[result['url']] = result
+    return [results[url] for url in dict.fromkeys(urls)]
 
-    # Images
-    images = [{'src': img.get('src'), 'alt': img.get('alt')} for img in soup.find_all('img')]
+@metrics.timed('analyze', analyzer='links')
+@skip_unchanged('links')
+def get_link_report(url):
+    """Returns the status and latency of every distinct HTTP link on a page."""
+    page = get_page(url)
+    if not page:
+        return []
+    targets = [normalize_link(url, href) for href in page.hrefs]
+    return probe_links([target for target in targets if target])
 
-    # Meta Tags
-    meta_tags = {meta.get('name', meta.get('property', 'unknown')): meta.get('content') for meta in soup.find_all('meta')}
+def check_links(url):
+    return [result['url'] for result in get_link_report(url) if not result['ok']]
 
-    # Scripts
-    scripts = [{'src': script.get('src'), 'content': script.string} for script in soup.find_all('script')]
+# Streaming sitemap engine
+SITEMAP_WORKERS = 8
+SITEMAP_MAX_FILES = 10000  # Upper bound on sitemap files followed from sitemap indexes
+SITEMAP_QUEUE_SIZE = 10000  # Entries buffered between the fetch threads and the consumer
+SITEMAP_CHUNK_SIZE = 64 * 1024
 
-    # Forms
-    forms = [{'action': form.get('action'), 'method': form.get('method'), 'inputs': [{'name': input.get('name'), 'type': input.get('type')} for input in form.find_all('input')]} for form in soup.find_all('form')]
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, such as Response.iter_content."""
 
-    # IFrames
-    iframes = [{'src': iframe.get('src')} for iframe in soup.find_all('iframe')]
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b''
 
-    # Comments
-    comments = [str(comment) for comment in soup.find_all(string=lambda text: isinstance(text, Comment))]
+    def readable(self):
+        return True
 
-    # Email Addresses
-    email_addresses = set(re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', main_content))
+    def readinto(self, target):
+        while not self.buffer:
+            self.buffer = next(self.chunks, None)
+            if self.buffer is None:
+                self.buffer = b''
+                return 0
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
 
-    # Phone Numbers
-    phone_numbers = set(re.findall(r'\+?\d[\d\s-]{7,}\d', main_content))
+def parse_robots_sitemaps(robots_txt):
+    """Returns the URLs of the Sitemap: lines of a robots.txt."""
+    sitemaps = []
+    for line in robots_txt.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line.lower().startswith('sitemap:'):
+            sitemap_url = line.split(':', 1)[1].strip()
+            if sitemap_url:
+                sitemaps.append(sitemap_url)
+    return sitemaps
 
-    return headers, main_content, lists, blockquotes, tables, links, images, meta_tags, scripts, forms, iframes, comments, email_addresses, phone_numbers
+def discover_sitemaps(url):
+    """Returns the sitemaps announced in robots.txt, or /sitemap.xml when robots.txt announces none."""
+    robots_txt = get_robots_txt(url)
+    sitemaps = parse_robots_sitemaps(robots_txt) if robots_txt else []
+    return sitemaps or [urllib.parse.urljoin(url, '/sitemap.xml')]
 
-def check_links(url):
-    response = retry_request(url)
-    if not response:
-        return []
+def open_sitemap(sitemap_url, retries=3, delay=2):
+    """Opens a sitemap as a streamed, decompressed byte stream. Returns None if it cannot be fetched."""
+    host = urllib.parse.urlparse(sitemap_url).netloc
+    for attempt in range(retries):
+        response = fetch_response(sitemap_url, stream=True)
+        if response is not None and response.ok:
+            stream = io.BufferedReader(ChunkStream(response.iter_content(SITEMAP_CHUNK_SIZE)), SITEMAP_CHUNK_SIZE)
+            # .xml.gz files are usually served without Content-Encoding: recognise them by their magic bytes
+            if stream.peek(2)[:2] == b'\x1f\x8b':
+                return gzip.GzipFile(fileobj=stream)
+            return stream
+        if response is not None:
+            response.close()
+            if response.status_code not in RETRY_STATUSES:
+                break
+        if attempt + 1 < retries:
+            rate_limiter.backoff(host, delay * 2 ** attempt)
+    logging.error(f"Failed to retrieve sitemap from {sitemap_url}")
+    return None
+
+def iter_sitemap_entries(stream):
+    """Parses a sitemap incrementally and yields ('url' or 'sitemap', loc, lastmod) for each entry."""
+    loc = lastmod = None
+    root = None
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if root is None:
+            root = element
+        if event == 'start':
+            continue
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'loc':
+            loc = (element.text or '').strip()
+        elif tag == 'lastmod':
+            lastmod = (element.text or '').strip() or None
+        elif tag in ('url', 'sitemap'):
+            if loc:
+                yield tag, loc, lastmod
+            loc = lastmod = None
+            # Drop the finished entries so memory stays flat however big the sitemap is
+            root.clear()
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-    links = [a['href'] for a in soup.find_all('a', href=True)]
-    broken_links = []
-    for link in links:
-        link_response = retry_request(link)
-        if link_response and link_response.status_code != 200:
-            broken_links.append(link)
-        elif not link_response:
-            broken_links.append(link)
+def iter_sitemap_urls(url, workers=SITEMAP_WORKERS, max_sitemaps=SITEMAP_MAX_FILES):
+    """Yields (url, lastmod) for every page in the site's sitemaps.
 
-    return broken_links
+    Sitemaps are discovered through robots.txt, sitemap indexes are followed and child
+    sitemaps are fetched concurrently. Entries are handed over through a bounded queue,
+    so only a small window of the URLs is ever held in memory.
+    """
+    entries = queue.Queue(maxsize=SITEMAP_QUEUE_SIZE)
+    stop = threading.Event()
+    finished = object()
+    seen_sitemaps = set()
 
-def parse_sitemap(url):
-    sitemap_url = urllib.parse.urljoin(url, '/sitemap.xml')
-    response = retry_request(sitemap_url)
-    if not response:
-        print(f"Failed to retrieve sitemap from {sitemap_url}")
-        return []
+    def hand_over(entry):
+        while not stop.is_set():
+            try:
+                entries.put(entry, timeout=0.5)
+                return
+            except queue.Full:
+                continue
 
-    sitemap_urls = []
+    def read_sitemap(sitemap_url):
+        try:
+            stream = open_sitemap(sitemap_url)
+            if stream is None:
+                return
+            with stream:
+                for entry in iter_sitemap_entries(stream):
+                    if stop.is_set():
+                        return
+                    hand_over(entry)
+        except (ET.ParseError, OSError, EOFError, requests.exceptions.RequestException) as e:
+            logging.error(f"Error parsing sitemap {sitemap_url}: {e}")
+        finally:
+            hand_over(finished)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = 0
     try:
-        soup = BeautifulSoup(response.content, 'xml')
-        for loc in soup.find_all('loc'):
-            sitemap_urls.append(loc.get_text())
-    except Exception as e:
-        logging.error(f"Error parsing sitemap: {e}")
-    
+        for sitemap_url in discover_sitemaps(url):
+            if sitemap_url not in seen_sitemaps:
+                seen_sitemaps.add(sitemap_url)
+                executor.submit(read_sitemap, sitemap_url)
+                pending += 1
+        while pending:
+            entry = entries.get()
+            if entry is finished:
+                pending -= 1
+                continue
+            kind, loc, lastmod = entry
+            if kind == 'url':
+                yield loc, lastmod
+            elif loc not in seen_sitemaps and len(seen_sitemaps) < max_sitemaps:
+                seen_sitemaps.add(loc)
+                executor.submit(read_sitemap, loc)
+                pending += 1
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+@metrics.timed('analyze', analyzer='sitemap')
+def parse_sitemap(url):
+    sitemap_urls = [loc for loc, _ in iter_sitemap_urls(url)]
+    if not sitemap_urls:
+        print(f"No sitemap URLs found for {url}")
     return sitemap_urls
 
+@metrics.timed('analyze', analyzer='performance')
 def get_performance_metrics(url):
-    start_time = time.time()
+    """Times one uncached download of the page. Retries and rate-limit waits are not included:
+    load_time is the time to the response headers (ttfb) plus the body download."""
     print(f"Fetching URL for performance metrics: {url}")
-    response = retry_request(url)
+    response = retry_request(url, use_cache=False)
     if not response:
         logging.error(f"Failed to fetch the URL for performance metrics: {url}")
-        return {'load_time': 'N/A', 'page_size': 'N/A'}
+        return {'load_time': 'N/A', 'ttfb': 'N/A', 'download_time': 'N/A', 'page_size': 'N/A', 'transfer_size': 'N/A'}
     
-    load_time = time.time() - start_time
+    ttfb = response.elapsed.total_seconds()
+    download_time = getattr(response, 'download_time', 0.0)
+    load_time = ttfb + download_time
     page_size = len(response.content)
+    transfer_size = getattr(response, 'transfer_size', page_size)
     
     print(f"Load Time: {load_time} seconds")
+    print(f"Time to First Byte: {ttfb} seconds")
+    print(f"Download Time: {download_time} seconds")
     print(f"Page Size: {page_size} bytes")
+    print(f"Transfer Size: {transfer_size} bytes")
     
-    return {'load_time': load_time, 'page_size': page_size}
+    return {'load_time': load_time, 'ttfb': ttfb, 'download_time': download_time, 'page_size': page_size,
+            'transfer_size': transfer_size}
+
+# Headless browser pool used to render JavaScript pages
+BROWSER_CONTEXTS = 4
+BROWSER_PAGES_PER_CONTEXT = 50  # A context is recycled after rendering this many pages
+BROWSER_MAX_MEMORY_MB = 1500  # Contexts are recycled when the browser processes grow past this (needs psutil)
+BROWSER_RENDER_TIMEOUT = 30000  # Milliseconds
+BLOCKED_RESOURCE_TYPES = ('image', 'font', 'media')
+
+def _browser_memory_mb():
+    """Returns the resident memory of this process's children (the browser) in MB, or None without psutil."""
+    if importlib.util.find_spec('psutil') is None:
+        return None
+    import psutil
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+class BrowserPool:
+    """A long-lived Chromium with a fixed number of browser contexts that render pages in parallel.
+
+    Playwright's async API runs on a private event loop in a background thread, so the pool
+    can be used from ordinary blocking code and from several threads at once.
+    """
+
+    def __init__(self, contexts=BROWSER_CONTEXTS, pages_per_context=BROWSER_PAGES_PER_CONTEXT,
+                 block_resources=BLOCKED_RESOURCE_TYPES, max_memory_mb=BROWSER_MAX_MEMORY_MB,
+                 timeout=BROWSER_RENDER_TIMEOUT):
+        self.contexts = contexts
+        self.pages_per_context = pages_per_context
+        self.block_resources = set(block_resources or ())
+        self.max_memory_mb = max_memory_mb
+        self.timeout = timeout
+        self.loop = None
+        self.thread = None
+        self.playwright = None
+        self.browser = None
+        self.slots = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='scrapez-browser-pool', daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+            self.loop = loop
+            self.thread = thread
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+        self.playwright = await async_playwright().start()
+        try:
+            self.browser = await self.playwright.chromium.launch(headless=True)
+        except Exception:
+            await self.playwright.stop()
+            raise
+        self.slots = asyncio.Queue()
+        for _ in range(self.contexts):
+            self.slots.put_nowait({'context': None, 'pages': 0})
+
+    async def _block_request(self, route):
+        if route.request.resource_type in self.block_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_context(self):
+        context = await self.browser.new_context(user_agent=choice(user_agents))
+        context.set_default_timeout(self.timeout)
+        if self.block_resources:
+            await context.route('**/*', self._block_request)
+        return context
+
+    def _needs_recycling(self, slot):
+        if slot['pages'] >= self.pages_per_context:
+            return True
+        if self.max_memory_mb:
+            memory = _browser_memory_mb()
+            return memory is not None and memory > self.max_memory_mb
+        return False
+
+    async def _render(self, url):
+        slot = await self.slots.get()
+        try:
+            if slot['context'] is not None and self._needs_recycling(slot):
+                await slot['context'].close()
+                slot['context'] = None
+            if slot['context'] is None:
+                slot['context'] = await self._new_context()
+                slot['pages'] = 0
+            page = await slot['context'].new_page()
+            try:
+                await page.goto(url)
+                await page.wait_for_selector('body')
+                return await page.content()
+            finally:
+                slot['pages'] += 1
+                await page.close()
+        finally:
+            self.slots.put_nowait(slot)
+
+    def render(self, url):
+        """Renders one URL and returns the resulting HTML."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._render(url), self.loop).result()
+
+    def render_many(self, urls):
+        """Renders several URLs in parallel. Returns {url: html}, with None for pages that failed."""
+        self.start()
+        futures = {url: asyncio.run_coroutine_threadsafe(self._render(url), self.loop) for url in dict.fromkeys(urls)}
+        rendered = {}
+        for url, future in futures.items():
+            try:
+                rendered[url] = future.result()
+            except Exception as e:
+                logging.error(f"Rendering {url} failed: {e}")
+                rendered[url] = None
+        return rendered
+
+    async def _close(self):
+        while not self.slots.empty():
+            slot = self.slots.get_nowait()
+            if slot['context'] is not None:
+                await slot['context'].close()
+        await self.browser.close()
+        await self.playwright.stop()
+
+    def close(self):
+        with self.lock:
+            if self.loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+            except Exception as e:
+                logging.error(f"Closing the browser pool failed: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+_geckodriver_path = None
+
+def get_browser_pool():
+    """Returns the process-wide browser pool, created on first use and closed at exit."""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool()
+            atexit.register(_browser_pool.close)
+        return _browser_pool
+
+def render_with_geckodriver(url):
+    global _geckodriver_path
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options
+    from selenium.webdriver.firefox.service import Service
+    if _geckodriver_path is None:
+        from webdriver_manager.firefox import GeckoDriverManager
+        _geckodriver_path = GeckoDriverManager().install()
+    options = Options()
+    options.add_argument("--headless")
+    driver = webdriver.Firefox(service=Service(_geckodriver_path), options=options)
+    try:
+        driver.get(url)
+        return driver.page_source
+    finally:
+        driver.quit()
+
+def js_content_path(url, directory):
+    # Sanitize the filename for JS content
+    filename = sanitize_filename(url) + '-js-content.html'
+    return os.path.join(directory, filename)  # Save in the specified directory
+
+def save_js_content(url, content, directory):
+    filepath = js_content_path(url, directory)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as file:
+            file.write(content)
+        print(f"JavaScript content saved to {filepath}")
+    except IOError as e:
+        logging.error(f"Failed to write content to file: {e}", exc_info=True)
+    return filepath
 
 def get_js_content(url, directory):
     content = None
     try:
-        # Try to get the JS content using Playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(url)
-            page.wait_for_selector('body')
-            content = page.content()
-            browser.close()
+        # Try to get the JS content using the shared Playwright browser pool
+        content = get_browser_pool().render(url)
     except Exception as e:
         logging.error(f"Playwright failed: {e}", exc_info=True)
 
     if content is None:
         try:
             # Fallback to GeckoDriver if Playwright fails
-            options = Options()
-            options.add_argument("--headless")
-
-            service = Service(GeckoDriverManager().install())
-            driver = webdriver.Firefox(service=service, options=options)
-            driver.get(url)
-            content = driver.page_source
-            driver.quit()
+            content = render_with_geckodriver(url)
         except Exception as e:
             logging.error(f"GeckoDriver failed: {e}", exc_info=True)
             content = "Failed to retrieve content"
 
     if content:
-        # Sanitize the filename for JS content
-        filename = sanitize_filename(url) + '-js-content.html'
-        filepath = os.path.join(directory, filename)  # Save in the specified directory
-        try:
-            with open(filepath, 'w', encoding='utf-8') as file:
-                file.write(content)
-            print(f"JavaScript content saved to {filepath}")
-        except IOError as e:
-            logging.error(f"Failed to write content to file: {e}", exc_info=True)
+        save_js_content(url, content, directory)
 
     return content
 
+# Render on demand: only use the browser when the static HTML does not hold the page content
+JS_RENDER_MODE = 'auto'  # 'auto', 'always' or 'never'
+JS_MIN_TEXT_LENGTH = 200  # Visible characters below which a page is considered empty
+JS_MIN_TEXT_RATIO = 0.02  # Visible text / HTML size below which a small page is considered script-built
+JS_NOSCRIPT_HINTS = ('javascript', 'enable js', 'browser does not support')
+
+def needs_js_rendering(response):
+    """Decides from the static response whether the page needs client-side rendering.
+
+    Returns (needs_rendering, reason).
+    """
+    if not is_html_response(response):
+        return False, 'not an HTML page'
+    page = parse_page(response)
+    text_length = len(page.text)
+    for root in page.app_roots:
+        if root['empty']:
+            return True, f"empty application root #{root['id']}"
+    if text_length < JS_MIN_TEXT_LENGTH:
+        noscript_text = ' '.join(page.noscript).lower()
+        if any(hint in noscript_text for hint in JS_NOSCRIPT_HINTS):
+            return True, 'noscript asks for JavaScript'
+        if text_length / max(len(response.content), 1) < JS_MIN_TEXT_RATIO:
+            return True, f"only {text_length} visible characters in {len(response.content)} bytes of HTML"
+    return False, 'static HTML is sufficient'
+
+@metrics.timed('analyze', analyzer='js')
+def get_rendered_content(url, directory, mode=None):
+    """Returns the page's content, rendering it in a browser only when needed.
+
+    The returned record says which path was taken: {'url', 'render_mode', 'reason', 'content', 'file'}.
+    """
+    mode = mode or JS_RENDER_MODE
+    response = retry_request(url)
+    if mode == 'always' or response is None:
+        rendered, reason = True, 'forced' if mode == 'always' else 'static fetch failed'
+    elif mode == 'never':
+        rendered, reason = False, 'rendering disabled'
+    else:
+        rendered, reason = needs_js_rendering(response)
+
+    if rendered:
+        content = get_js_content(url, directory)
+    else:
+        content = response.text if response is not None else None
+        if content:
+            save_js_content(url, content, directory)
+    logging.info(f"{url}: {'browser' if rendered else 'static'} ({reason})")
+    return {'url': url, 'render_mode': 'browser' if rendered else 'static', 'reason': reason, 'content': content,
+            'file': js_content_path(url, directory) if content else None}
+
+def render_js_pages(urls, directory):
+    """Renders many pages through the browser pool and saves each one. Returns {url: html}."""
+    try:
+        rendered = get_browser_pool().render_many(urls)
+    except Exception as e:
+        logging.error(f"Playwright failed: {e}", exc_info=True)
+        rendered = {url: None for url in urls}
+    for url, content in rendered.items():
+        if content is None:
+            rendered[url] = content = get_js_content(url, directory)
+        else:
+            save_js_content(url, content, directory)
+    return rendered
+
+def format_link_result(result):
+    status = result['status'] if result['status'] is not None else 'error'
+    latency = f"{result['latency']:.3f}s" if result['latency'] is not None else 'N/A'
+    return f"{status} ({result['method']}, {latency}) {result['url']}"
+
 def write_section(file, title, content, bullet_points=False):
     """Writes a section to the file."""
     file.write(f"## {title}\n")
@@ -360,6 +3547,7 @@ def write_section(file, title, content, bullet_points=False):
     else:
         file.write(f"{content}\n\n")
 
+@metrics.timed('write', sink='markdown')
 def store_data(data, directory, file_suffix):
     """Stores scraped data into a markdown file."""
     os.makedirs(directory, exist_ok=True)
@@ -388,10 +3576,18 @@ def store_data(data, directory, file_suffix):
                 
             if 'broken_links' in data:
                 write_section(file, "Broken Links", data['broken_links'], bullet_points=True)
+
+            if 'link_report' in data:
+                write_section(file, "Link Report", [format_link_result(result) for result in data['link_report']],
+                              bullet_points=True)
                 
             if 'performance_metrics' in data:
-                metrics = data['performance_metrics']
-                file.write(f"## Performance Metrics\n**Load Time:** {metrics.get('load_time', 'N/A')} seconds\n**Page Size:** {metrics.get('page_size', 'N/A')} bytes\n\n")
+                performance = data['performance_metrics']
+                file.write(f"## Performance Metrics\n**Load Time:** {performance.get('load_time', 'N/A')} seconds\n"
+                           f"**Time to First Byte:** {performance.get('ttfb', 'N/A')} seconds\n"
+                           f"**Download Time:** {performance.get('download_time', 'N/A')} seconds\n"
+                           f"**Page Size:** {performance.get('page_size', 'N/A')} bytes\n"
+                           f"**Transfer Size:** {performance.get('transfer_size', 'N/A')} bytes\n\n")
                 
             if 'cookies' in data:
                 cookies = data['cookies']
@@ -403,8 +3599,12 @@ def store_data(data, directory, file_suffix):
             if 'language' in data:
                 file.write(f"## Detected Language\n{data['language']}\n\n")
                 
-            if 'js_content' in data:
-                file.write(f"## JavaScript Content\n```\n{data['js_content']}\n```\n\n")
+            if 'render_decision' in data:
+                decision = data['render_decision']
+                file.write(f"## Rendering\n**Mode:** {decision['render_mode']}\n**Reason:** {decision['reason']}\n\n")
+
+            if 'js_content_file' in data:
+                file.write(f"## JavaScript Content\nSaved to `{data['js_content_file']}`\n\n")
                 
         print(f"Data saved to {filepath}.")
         
@@ -434,6 +3634,8 @@ def write_content_analysis(file, content_analysis):
     # Tables
     file.write(f"\n### Tables\n")
     for table in content_analysis['tables']:
+        if table.get('caption'):
+            file.write(f"**Caption:** {table['caption']}\n")
         file.write(f"**Headers:** " + ", ".join(table['headers']) + "\n")
         for row in table['rows']:
             file.write(f"**Row:** " + ", ".join(row) + "\n")
@@ -485,6 +3687,23 @@ def write_content_analysis(file, content_analysis):
     for phone in content_analysis['phone_numbers']:
         file.write(f"- {phone}\n")
 
+    # Other Entities
+    for name, values in content_analysis.get('entities', {}).items():
+        if name not in ('email', 'phone'):
+            file.write(f"\n### Entities: {name}\n" + "".join(f"- {value}\n" for value in values))
+
+    # Structured Data
+    structured_data = content_analysis.get('structured_data', {})
+    if structured_data.get('json_ld') or structured_data.get('microdata') or structured_data.get('opengraph'):
+        file.write(f"\n### Structured Data\n")
+        for item in structured_data.get('json_ld', []):
+            file.write(f"- **JSON-LD {_type_name(item.get('@type'))}:** {json.dumps(item, ensure_ascii=False)}\n")
+        for item in structured_data.get('microdata', []):
+            file.write(f"- **Microdata {_type_name(item['type'])}:** {json.dumps(item['properties'], ensure_ascii=False)}\n")
+        for name, content in structured_data.get('opengraph', {}).items():
+            file.write(f"- **{name}:** {content}\n")
+
+@metrics.timed('write', sink='markdown')
 def store_analysis(data, directory):
     """Stores content analysis results into a markdown file."""
     os.makedirs(directory, exist_ok=True)
@@ -502,10 +3721,710 @@ def store_analysis(data, directory):
     except IOError as e:
         logging.error(f"Failed to save analysis to file: {e}")
 
+# Streaming result sinks: one record per page, appended as each page finishes
+SINK_BUFFER_RECORDS = 500
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+def to_json_line(record):
+    return json.dumps(record, ensure_ascii=False, default=_json_default) + '\n'
+
+class ResultSink(abc.ABC):
+    """Base class for result sinks. Records are buffered and flushed in batches; files can be rotated
+    after a number of records or bytes, each part being named <name>-00000<extension>."""
+
+    extension = ''
+
+    def __init__(self, path, buffer_records=SINK_BUFFER_RECORDS, rotate_records=None, rotate_bytes=None):
+        self.path = path
+        self.buffer_records = buffer_records
+        self.rotate_records = rotate_records
+        self.rotate_bytes = rotate_bytes
+        self.buffer = []
+        self.part = -1
+        self.part_records = 0
+        self.part_bytes = 0
+        self.records = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def rotating(self):
+        return bool(self.rotate_records or self.rotate_bytes)
+
+    def part_path(self):
+        if not self.rotating:
+            return self.path
+        stem = self.path[:-len(self.extension)] if self.extension and self.path.endswith(self.extension) else self.path
+        return f"{stem}-{self.part:05d}{self.extension}"
+
+    def next_part(self):
+        """Moves to the next part file that does not exist yet."""
+        self.part += 1
+        while self.rotating and os.path.exists(self.part_path()):
+            self.part += 1
+        self.part_records = 0
+        self.part_bytes = 0
+        return self.part_path()
+
+    def needs_rotation(self):
+        return ((self.rotate_records and self.part_records >= self.rotate_records) or
+                (self.rotate_bytes and self.part_bytes >= self.rotate_bytes))
+
+    def write(self, record):
+        self.buffer.append(record)
+        self.records += 1
+        metrics.count('records_written')
+        if len(self.buffer) >= self.buffer_records:
+            self.flush()
+
+    @abc.abstractmethod
+    def flush(self):
+        """Writes the buffered records."""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JsonlSink(ResultSink):
+    """Line-delimited JSON, optionally gzip-compressed. Without rotation, records are appended to path."""
+
+    def __init__(self, path, compress=False, **kwargs):
+        self.compress = compress
+        self.extension = '.jsonl.gz' if compress else '.jsonl'
+        super().__init__(path, **kwargs)
+        self.file = None
+        self.stdout = sys.stdout
+
+    def _open(self):
+        if self.path == '-':
+            self.file = self.stdout
+            return
+        path = self.next_part()
+        self.file = gzip.open(path, 'at', encoding='utf-8') if self.compress else open(path, 'a', encoding='utf-8')
+
+    @metrics.timed('write', sink='jsonl')
+    def flush(self):
+        for record in self.buffer:
+            if self.file is None or (self.rotating and self.needs_rotation()):
+                if self.file is not None and self.file is not self.stdout:
+                    self.file.close()
+                self._open()
+            line = to_json_line(record)
+            self.file.write(line)
+            self.part_records += 1
+            self.part_bytes += len(line)
+        self.buffer = []
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        self.flush()
+        if self.file is not None and self.file is not self.stdout:
+            self.file.close()
+        self.file = None
+
+class ParquetSink(ResultSink):
+    """Columnar Parquet output through pyarrow (optional dependency: pip install pyarrow).
+
+    Each flush becomes a row group. Scalar fields keep their type; lists and dicts are stored as
+    JSON strings. A batch that does not fit the file's schema starts a new part file.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, path, **kwargs):
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+        super().__init__(path, **kwargs)
+        self.writer = None
+        self.schema = None
+        self.part_rotation = False
+
+    @property
+    def rotating(self):
+        return super().rotating or self.part_rotation
+
+    def _columns(self, records):
+        names = list(dict.fromkeys(name for record in records for name in record))
+        columns = {}
+        for name in names:
+            values = [record.get(name) for record in records]
+            types = {type(value) for value in values if value is not None}
+            if any(issubclass(kind, (dict, list, set, tuple)) for kind in types):
+                values = [None if value is None else json.dumps(value, ensure_ascii=False, default=_json_default)
+                          for value in values]
+            elif len(types - {int, float}) > 1 or (len(types) > 1 and not types <= {int, float}):
+                # Mixed scalar types are kept as text
+                values = [None if value is None else str(value) for value in values]
+            columns[name] = values
+        return columns
+
+    def _fit(self, table):
+        """Returns the table cast to the open file's schema, or None if it does not fit."""
+        import pyarrow as pa
+        if not set(table.column_names) <= set(self.schema.names):
+            return None
+        for field in self.schema:
+            if field.name not in table.column_names:
+                table = table.append_column(field.name, pa.nulls(table.num_rows, field.type))
+        try:
+            return table.select(self.schema.names).cast(self.schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+
+    @metrics.timed('write', sink='parquet')
+    def flush(self):
+        if not self.buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table(self._columns(self.buffer))
+        if self.writer is not None:
+            fitted = self._fit(table)
+            if fitted is None or self.needs_rotation():
+                # Continue in a new part file
+                self.writer.close()
+                self.writer = None
+                self.part_rotation = True
+            else:
+                table = fitted
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.next_part(), self.schema)
+        self.writer.write_table(table)
+        self.part_records += table.num_rows
+        self.part_bytes += table.nbytes
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class MarkdownSink(ResultSink):
+    """The original markdown reports, one directory per URL."""
+
+    def __init__(self, directory, **kwargs):
+        # Each report is written as soon as its record comes in
+        super().__init__(os.path.join(directory, ''), **{**kwargs, 'buffer_records': 1})
+        self.directory = directory
+
+    def flush(self):
+        for record in self.buffer:
+            directory = os.path.join(self.directory, sanitize_filename(record.get('url', 'unknown')))
+            store_data(record, directory, 'all')
+            if 'content_analysis' in record:
+                store_analysis(record, directory)
+        self.buffer = []
+
+class Frame:
+    """Columns of one kind of record. Rows are appended value by value, no row objects are kept."""
+
+    def __init__(self):
+        self.columns = {}
+        self.length = 0
+
+    def append(self, row):
+        for name, value in row.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = [None] * self.length
+            column.append(value)
+        self.length += 1
+        for column in self.columns.values():
+            if len(column) < self.length:
+                column.append(None)
+
+    def to_columns(self):
+        return {name: type_column(values) for name, values in self.columns.items()}
+
+def _flatten_item(value, prefix='', row=None):
+    """Flattens nested dicts into dotted column names ('offers.price'); one-element lists are unwrapped."""
+    row = {} if row is None else row
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key != '@context':
+                _flatten_item(item, f"{prefix}.{key}" if prefix else key, row)
+    elif isinstance(value, list) and len(value) == 1:
+        _flatten_item(value[0], prefix, row)
+    else:
+        row[prefix] = value
+    return row
+
+def _microdata_as_json_ld(item):
+    """Rewrites a microdata item ({'type', 'properties'}) the way JSON-LD writes it ({'@type', ...})."""
+    def convert(value):
+        if isinstance(value, dict):
+            return _microdata_as_json_ld(value)
+        if isinstance(value, list):
+            return [convert(entry) for entry in value]
+        return value
+    return {'@type': _type_name(item['type']), **{name: convert(value) for name, value in item['properties'].items()}}
+
+def _type_name(item_type):
+    """Short name of a schema.org type: 'Product' for https://schema.org/Product, 'Thing' when missing."""
+    if isinstance(item_type, list):
+        return '+'.join(_type_name(entry) for entry in item_type)
+    if not item_type:
+        return 'Thing'
+    return item_type.split()[0].rstrip('/').rsplit('/', 1)[-1].rsplit('#', 1)[-1]
+
+class StructuredFrames:
+    """Collects the tables and structured data of many pages into columnar frames.
+
+    Tables with the same headers share a frame (table-<headers>-<hash>). JSON-LD and microdata items
+    get one frame per type (jsonld-Product, microdata-Product), with nested properties flattened into
+    dotted column names, and OpenGraph properties one opengraph frame. Every frame has a url column.
+    Columns are typed when the frames are read (see type_column).
+    """
+
+    def __init__(self):
+        self.frames = {}
+
+    def _append(self, name, url, row):
+        frame = self.frames.get(name)
+        if frame is None:
+            frame = self.frames[name] = Frame()
+        frame.append({'url': url, **row})
+
+    def add(self, url, structured_data):
+        for table in structured_data.get('tables', []):
+            headers = table['headers']
+            slug = re.sub(r'[^A-Za-z0-9]+', '_', '_'.join(headers)).strip('_')[:40]
+            digest = hashlib.blake2b(json.dumps(headers).encode('utf-8'), digest_size=4).hexdigest()
+            for record in table['records']:
+                self._append(f"table-{slug}-{digest}", url, record)
+        for item in structured_data.get('json_ld', []):
+            self._append(f"jsonld-{_type_name(item.get('@type'))}", url, _flatten_item(item))
+        for item in structured_data.get('microdata', []):
+            item = _microdata_as_json_ld(item)
+            self._append(f"microdata-{item['@type']}", url, _flatten_item(item))
+        if structured_data.get('opengraph'):
+            self._append('opengraph', url, structured_data['opengraph'])
+
+    def add_page(self, page):
+        self.add(page.url, extract_structured_data(page))
+
+    def add_record(self, record):
+        """Adds the structured data of a results record, if its content was analyzed."""
+        content_analysis = record.get('content_analysis')
+        if isinstance(content_analysis, dict) and content_analysis.get('structured_data'):
+            self.add(record.get('url'), content_analysis['structured_data'])
+
+    def to_columns(self):
+        """Returns {frame name: {column name: values}}."""
+        return {name: frame.to_columns() for name, frame in self.frames.items()}
+
+    def to_pandas(self):
+        """Returns {frame name: pandas.DataFrame} (optional dependency: pip install pandas)."""
+        import pandas
+        return {name: pandas.DataFrame(columns) for name, columns in self.to_columns().items()}
+
+    def to_arrow(self):
+        """Returns {frame name: pyarrow.Table} (optional dependency: pip install pyarrow)."""
+        import pyarrow as pa
+        return {name: pa.table(columns) for name, columns in self.to_columns().items()}
+
+    @metrics.timed('write', sink='frames')
+    def write(self, directory):
+        """Writes one file per frame to directory: Parquet when pyarrow is installed, CSV otherwise.
+        Returns the paths written."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        if importlib.util.find_spec('pyarrow') is not None:
+            import pyarrow.parquet as pq
+            for name, table in self.to_arrow().items():
+                paths.append(os.path.join(directory, f"{name}.parquet"))
+                pq.write_table(table, paths[-1])
+            return paths
+        import csv
+        for name, columns in self.to_columns().items():
+            paths.append(os.path.join(directory, f"{name}.csv"))
+            with open(paths[-1], 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                writer.writerows(zip(*columns.values()))
+        return paths
+
+class FramesSink(ResultSink):
+    """Passes records on to another sink and collects the structured data of their content analysis
+    into StructuredFrames, which are written to directory when the sink is closed."""
+
+    def __init__(self, sink, directory):
+        super().__init__(os.path.join(directory, ''), buffer_records=1)
+        self.sink = sink
+        self.directory = directory
+        self.frames = StructuredFrames()
+
+    def write(self, record):
+        self.sink.write(record)
+        self.frames.add_record(record)
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        self.sink.close()
+        self.frames.write(self.directory)
+
+SINK_FORMATS = {
+    'jsonl': lambda path, **kwargs: JsonlSink(path, **kwargs),
+    'jsonl.gz': lambda path, **kwargs: JsonlSink(path, compress=True, **kwargs),
+    'parquet': lambda path, **kwargs: ParquetSink(path, **kwargs),
+    'markdown': lambda path, **kwargs: MarkdownSink(path, **kwargs),
+}
+
+def open_sink(output_format, path, **kwargs):
+    """Opens a result sink: 'jsonl', 'jsonl.gz', 'parquet' or 'markdown' (path is then a directory)."""
+    if output_format not in SINK_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose from {list(SINK_FORMATS)}")
+    return SINK_FORMATS[output_format](path, **kwargs)
+
+# Features, by menu number and by command-line name
+FEATURES = {
+    'subdomains': '1',
+    'pages': '2',
+    'robots': '3',
+    'embedded': '4',
+    'metadata': '5',
+    'content': '6',
+    'links': '7',
+    'performance': '8',
+    'cookies': '9',
+    'sitemap': '10',
+    'language': '11',
+    'js': '12',
+}
+
+def scan_url(website_url, choices, directory, visited_urls=None, markdown=True):
+    """Runs the selected features on one URL and returns the results record.
+
+    choices holds menu numbers or feature names. Files the features save (markdown reports when
+    markdown is True, rendered HTML, crawl state) go to directory.
+    """
+    choices = [FEATURES.get(choice, choice) for choice in choices]
+    visited_urls = visited_urls if visited_urls is not None else SeenSet()
+    os.makedirs(directory, exist_ok=True)
+    data = {'url': website_url}
+
+    if '1' in choices:
+        data['subdomain_links'] = scrape_subdomain_links(website_url, visited_urls)
+        if markdown:
+            store_data({'url': website_url, 'subdomain_links': data['subdomain_links']}, directory, 'subdomain_links')
+
+    if '2' in choices:
+        data['pages_links'] = scrape_pages_links(website_url, visited_urls, first_call=True,
+                                                 state_path=os.path.join(directory, 'pages_crawl_state.sqlite'))
+        if markdown:
+            store_data({'url': website_url, 'pages_links': data['pages_links']}, directory, 'pages_links')
+
+    if '3' in choices:
+        data['robots_txt'] = scrape_robots_txt(website_url)
+        if markdown:
+            store_data({'url': website_url, 'robots_txt': data['robots_txt']}, directory, 'robots_txt')
+
+    if '4' in choices:
+        data['embedded_links'] = scrape_embedded_links(website_url)
+        if markdown:
+            store_data({'url': website_url, 'embedded_links': data['embedded_links']}, directory, 'embedded_links')
+
+    if '5' in choices:
+        title, description = get_metadata(website_url)
+        data['metadata'] = {'title': title, 'description': description}
+        if markdown:
+            store_data({'url': website_url, 'metadata': data['metadata']}, directory, 'metadata')
+
+    if '6' in choices:
+        data['content_analysis'] = content_analysis_record(website_url)
+        if markdown:
+            store_analysis(data, directory)
+
+    if '7' in choices:
+        data['link_report'] = get_link_report(website_url)
+        data['broken_links'] = [result['url'] for result in data['link_report'] if not result['ok']]
+        if markdown:
+            store_data({'url': website_url, 'broken_links': data['broken_links'], 'link_report': data['link_report']},
+                       directory, 'broken_links')
+
+    if '8' in choices:
+        data['performance_metrics'] = get_performance_metrics(website_url)
+        if markdown:
+            store_data({'url': website_url, 'performance_metrics': data['performance_metrics']}, directory, 'performance_metrics')
+
+    if '9' in choices:
+        data['cookies'] = handle_cookies(website_url)
+        if markdown:
+            store_data({'url': website_url, 'cookies': data['cookies']}, directory, 'cookies')
+
+    if '10' in choices:
+        data['sitemap_urls'] = parse_sitemap(website_url)
+        if markdown:
+            store_data({'url': website_url, 'sitemap_urls': data['sitemap_urls']}, directory, 'sitemap_urls')
+
+    if '11' in choices:
+        data['language'] = get_language(website_url)
+        if markdown:
+            store_data({'url': website_url, 'language': data['language']}, directory, 'language')
+
+    if '12' in choices:
+        rendered = get_rendered_content(website_url, directory)
+        data['js_content_file'] = rendered['file']
+        data['render_decision'] = {'render_mode': rendered['render_mode'], 'reason': rendered['reason']}
+        if markdown:
+            store_data({'url': website_url, 'js_content_file': data['js_content_file'],
+                        'render_decision': data['render_decision']}, directory, 'js_content')
+
+    return data
+
+def read_targets(urls=(), input_file=None):
+    """Returns the target URLs from the command line and from a file ('-' reads stdin), one per line."""
+    targets = list(urls)
+    if input_file:
+        source = sys.stdin if input_file == '-' else open(input_file, encoding='utf-8')
+        try:
+            for line in source:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    targets.append(line)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+    normalized = []
+    for target in targets:
+        if not urllib.parse.urlparse(target).scheme:
+            target = f"https://{target}"
+        normalized.append(target)
+    return list(dict.fromkeys(normalized))
+
+def scan_target(website_url, features, results_directory):
+    """Scans one target for the batch mode. Unreachable targets give a record with an 'error' key."""
+    if not retry_request(website_url):
+        logging.error(f"Error accessing {website_url}")
+        return {'url': website_url, 'error': 'unreachable'}
+    try:
+        directory = os.path.join(results_directory, sanitize_filename(website_url))
+        return scan_url(website_url, features, directory, markdown=False)
+    except Exception as e:
+        logging.error(f"Scanning {website_url} failed: {e}", exc_info=True)
+        return {'url': website_url, 'error': str(e)}
+
+SCAN_LANGUAGE_BATCH = 256  # Targets of scan_urls whose languages are detected together
+
+def scan_urls(urls, features, sink, results_directory='Results', jobs=4):
+    """Scans many URLs in this process, sharing the session, caches and pools, and writes one
+    record per URL to the sink as soon as it is done. Returns the number of failed targets.
+
+    Languages are detected for SCAN_LANGUAGE_BATCH targets at a time (see detect_languages), so
+    their records are written once the language of their batch is known.
+    """
+    urls = list(urls)
+    language = 'language' in features or '11' in features
+    if language:
+        features = [feature for feature in features if feature not in ('language', '11')]
+    batch_size = SCAN_LANGUAGE_BATCH if language else max(1, len(urls))
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for start in range(0, len(urls), batch_size):
+            futures = [executor.submit(scan_target, url, features, results_directory)
+                       for url in urls[start:start + batch_size]]
+            waiting = []
+            for future in as_completed(futures):
+                record = future.result()
+                if 'error' in record:
+                    failures += 1
+                elif language:
+                    waiting.append(record)
+                    continue
+                sink.write(record)
+            if waiting:
+                # One detection for the batch, over a process pool when it is large enough; get_language
+                # then finds every page's language memoized
+                detect_languages([page for page in executor.map(get_page, [record['url'] for record in waiting])
+                                  if page])
+                for record in waiting:
+                    record['language'] = get_language(record['url'])
+                    sink.write(record)
+    return failures
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(
+        prog='scrapez.py',
+        description="ScrapEZ batch mode: scan many URLs in one process. Run without arguments for the interactive menu.")
+    parser.add_argument('urls', nargs='*', help="URLs to scan")
+    parser.add_argument('-i', '--input', help="File with one URL per line, or - to read stdin")
+    features = parser.add_argument_group('features')
+    for name, number in FEATURES.items():
+        features.add_argument(f'--{name}', action='append_const', const=name, dest='features',
+                              help=f"Same as menu option {number}")
+    features.add_argument('--all', action='store_true', help="Run every feature")
+    output = parser.add_argument_group('output')
+    output.add_argument('-f', '--format', default='jsonl', choices=list(SINK_FORMATS), help="Output format")
+    output.add_argument('-o', '--output', default='-',
+                        help="Output file (directory for markdown); - writes JSON lines to stdout (default)")
+    output.add_argument('--rotate-records', type=int, help="Start a new output file after this many records")
+    output.add_argument('--results-dir', default='Results',
+                        help="Directory for crawl state, rendered HTML and the HTTP cache (default: Results)")
+    output.add_argument('--no-http-cache', action='store_true', help="Do not use the persistent HTTP cache")
+    output.add_argument('--frames', metavar='DIR',
+                        help="With --content, also write the tables and structured data of every page to DIR as "
+                             "columnar files, one per kind of record (Parquet with pyarrow, CSV otherwise)")
+    output.add_argument('--skip-unchanged', action='store_true',
+                        help="Keep page fingerprints in the results directory: pages unchanged since the last run "
+                             "reuse its --content and --links results, and near-duplicate pages of a crawl are collapsed")
+    parser.add_argument('-j', '--jobs', type=int, default=4, help="Targets scanned in parallel (default: 4)")
+    crawl = parser.add_argument_group('sharded crawl')
+    crawl.add_argument('--processes', type=int, nargs='?', const=0,
+                       help="Crawl every page of the targets over this many processes (default: one per CPU core) "
+                            "and write one record per page. Only --embedded, --metadata, --content and --language apply")
+    crawl.add_argument('--shard-by', choices=('host', 'url'), default='host',
+                       help="Give each process whole hosts (default) or spread the URLs of one site over all of them")
+    crawl.add_argument('--max-pages', type=int, help="Stop discovering pages after this many")
+    distributed = parser.add_argument_group('distributed crawl')
+    distributed.add_argument('--serve', nargs='?', const=f'{QUEUE_ADDRESS[0]}:{QUEUE_ADDRESS[1]}', metavar='HOST:PORT',
+                             help="Crawl every page of the targets with workers that lease URLs from a queue served "
+                                  f"at HOST:PORT (default: {QUEUE_ADDRESS[0]}:{QUEUE_ADDRESS[1]}). Same features as "
+                                  "--processes; a restarted coordinator resumes the crawl")
+    distributed.add_argument('--workers', type=int, default=0, help="Worker processes started next to --serve")
+    distributed.add_argument('--worker', metavar='HOST:PORT',
+                             help="Run a worker for the coordinator at HOST:PORT until its crawl is over")
+    distributed.add_argument('--authkey', default=os.environ.get('SCRAPEZ_AUTHKEY'),
+                             help="Key shared by the coordinator and its workers (default: $SCRAPEZ_AUTHKEY, "
+                                  "--serve makes one up and prints it)")
+    parser.add_argument('--entity', action='append', default=[], metavar='NAME=REGEX',
+                        help="Also extract this entity type with --content, can be repeated")
+    parser.add_argument('--log-file', default='scraper.log', help="Log file (default: scraper.log)")
+    parser.add_argument('--summary', action='store_true', help="Print per-stage timings and counters to stderr at the end")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="Write the run's metrics to FILE: Prometheus text for .prom/.txt, JSON otherwise")
+    return parser
+
+def run_cli(argv=None):
+    """Entry point of the batch mode. Returns the process exit status:
+    0 when every target was scanned, 1 when some failed, 2 on usage errors, 130 when interrupted."""
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    if args.worker:
+        if not args.authkey:
+            parser.error("--worker needs the coordinator's --authkey")
+        try:
+            address = parse_queue_address(args.worker)
+        except ValueError as e:
+            parser.error(str(e))
+        logging.basicConfig(filename=args.log_file, level=logging.INFO)
+        os.makedirs(args.results_dir, exist_ok=True)
+        if not args.no_http_cache:
+            enable_http_cache(os.path.join(args.results_dir, 'http_cache.sqlite'))
+        try:
+            pages = run_worker(address, args.authkey)
+        except KeyboardInterrupt:
+            return 130
+        except (ConnectionRefusedError, multiprocessing.AuthenticationError) as e:
+            print(f"Cannot work for the coordinator at {args.worker}: {e}", file=sys.stderr)
+            return 1
+        finally:
+            disable_http_cache()
+            if args.metrics:
+                write_metrics(args.metrics)
+            if args.summary:
+                print(metrics.summary(), file=sys.stderr)
+        print(f"Crawled {pages} pages for {args.worker}.", file=sys.stderr)
+        return 0
+    if args.serve is not None and args.processes is not None:
+        parser.error("use either --serve or --processes")
+    features = list(FEATURES) if args.all else (args.features or [])
+    if args.processes is not None or args.serve is not None:
+        features = list(PAGE_FEATURES) if args.all else features
+        if set(features) - set(PAGE_FEATURES):
+            parser.error("--processes and --serve only run --embedded, --metadata, --content and --language "
+                         "on every page")
+    elif not features:
+        parser.error("select at least one feature, or --all")
+    try:
+        targets = read_targets(args.urls, args.input)
+    except OSError as e:
+        parser.error(f"cannot read {args.input}: {e}")
+    if not targets:
+        parser.error("no URLs given")
+    if args.output == '-' and args.format != 'jsonl':
+        parser.error("only the jsonl format can be written to stdout, use --output")
+    if args.frames and 'content' not in features:
+        parser.error("--frames needs --content")
+    if args.serve is not None:
+        try:
+            queue_address = parse_queue_address(args.serve)
+        except ValueError as e:
+            parser.error(str(e))
+        if not args.authkey:
+            args.authkey = secrets.token_hex(16)
+            print(f"Workers join with: --worker {args.serve} --authkey {args.authkey}", file=sys.stderr)
+    for entity in args.entity:
+        name, _, pattern = entity.partition('=')
+        if not name or not pattern:
+            parser.error(f"--entity expects NAME=REGEX, got {entity!r}")
+        try:
+            register_entity_pattern(name, pattern)
+        except re.error as e:
+            parser.error(f"invalid --entity pattern for {name}: {e}")
+
+    logging.basicConfig(filename=args.log_file, level=logging.INFO)
+    os.makedirs(args.results_dir, exist_ok=True)
+    if not args.no_http_cache:
+        enable_http_cache(os.path.join(args.results_dir, 'http_cache.sqlite'))
+    if args.skip_unchanged:
+        enable_change_detection(os.path.join(args.results_dir, 'fingerprints.sqlite'))
+    # Records written to stdout are flushed one by one so a pipeline sees them as they come
+    sink = open_sink(args.format, args.output, rotate_records=args.rotate_records,
+                     buffer_records=1 if args.output == '-' else SINK_BUFFER_RECORDS)
+    if args.frames:
+        sink = FramesSink(sink, args.frames)
+    scanned = len(targets)
+    try:
+        # The features print their progress: keep it off stdout when stdout carries the records
+        with contextlib.redirect_stdout(sys.stderr) if args.output == '-' else contextlib.nullcontext():
+            if args.serve is not None:
+                scanned, failures = serve_work_queue(targets, features, sink, address=queue_address,
+                                                     authkey=args.authkey, workers=args.workers,
+                                                     state_path=os.path.join(args.results_dir, 'work_queue.sqlite'),
+                                                     max_pages=args.max_pages)
+            elif args.processes is not None:
+                links, failures = crawl_sharded(targets, features, sink, processes=args.processes or None,
+                                                max_pages=args.max_pages, shard_by=args.shard_by)
+                scanned += len(links)
+            else:
+                failures = scan_urls(targets, features, sink, args.results_dir, args.jobs)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        sink.close()
+        disable_http_cache()
+        disable_change_detection()
+        if args.metrics:
+            write_metrics(args.metrics)
+        if args.summary:
+            print(metrics.summary(), file=sys.stderr)
+    print(f"Scanned {scanned} URLs, {failures} failed.", file=sys.stderr)
+    return 1 if failures else 0
+
 def main():
+    logging.basicConfig(filename='scraper.log', level=logging.INFO)
+
     # Ensure the "Results" directory exists
     main_directory = 'Results'
     os.makedirs(main_directory, exist_ok=True)
+    enable_http_cache(os.path.join(main_directory, 'http_cache.sqlite'))
 
     while True:
         website_url = input("Enter the website URL: ").strip()
@@ -525,7 +4444,6 @@ def main():
 
     # Create a directory based on the sanitized URL inside the "Results" directory
     directory = os.path.join(main_directory, sanitize_filename(website_url))
-    os.makedirs(directory, exist_ok=True)
 
     print("Choose which scraping methods to use:")
     print("1. Scrape subdomain & related links")
@@ -539,83 +4457,21 @@ def main():
     print("9. Handle cookies")
     print("10. Parse sitemap")
     print("11. Detect language")
-    print("12. Get JS content")
+    print("12. Get JS content (rendered in a browser only when needed)")
     choices = input("Enter your choices (separated by commas): ").strip()
 
     choices = [choice.strip() for choice in choices.split(',')]
-    visited_urls = set()
-    data = {'url': website_url}
-
-    # Collect data based on user choices
-    if '1' in choices:
-        data['subdomain_links'] = scrape_subdomain_links(website_url, visited_urls)
-        store_data({'url': website_url, 'subdomain_links': data['subdomain_links']}, directory, 'subdomain_links')
-
-    if '2' in choices:
-        data['pages_links'] = scrape_pages_links(website_url, visited_urls, first_call=True)
-        store_data({'url': website_url, 'pages_links': data['pages_links']}, directory, 'pages_links')
-
-    if '3' in choices:
-        data['robots_txt'] = scrape_robots_txt(website_url)
-        store_data({'url': website_url, 'robots_txt': data['robots_txt']}, directory, 'robots_txt')
-
-    if '4' in choices:
-        data['embedded_links'] = scrape_embedded_links(website_url)
-        store_data({'url': website_url, 'embedded_links': data['embedded_links']}, directory, 'embedded_links')
-
-    if '5' in choices:
-        title, description = get_metadata(website_url)
-        data['metadata'] = {'title': title, 'description': description}
-        store_data({'url': website_url, 'metadata': data['metadata']}, directory, 'metadata')
-
-    if '6' in choices:
-        (headers, content, lists, blockquotes, tables, links, images, meta_tags, scripts, forms,
-         iframes, comments, email_addresses, phone_numbers) = get_content_analysis(website_url)
-        data['content_analysis'] = {
-            'headers': headers,
-            'content': content,
-            'lists': lists,
-            'blockquotes': blockquotes,
-            'tables': tables,
-            'links': links,
-            'images': images,
-            'meta_tags': meta_tags,
-            'scripts': scripts,
-            'forms': forms,
-            'iframes': iframes,
-            'comments': comments,
-            'email_addresses': email_addresses,
-            'phone_numbers': phone_numbers
-        }
-        store_analysis(data, directory)
-
-    if '7' in choices:
-        data['broken_links'] = check_links(website_url)
-        store_data({'url': website_url, 'broken_links': data['broken_links']}, directory, 'broken_links')
-
-    if '8' in choices:
-        data['performance_metrics'] = get_performance_metrics(website_url)
-        store_data({'url': website_url, 'performance_metrics': data['performance_metrics']}, directory, 'performance_metrics')
+    data = scan_url(website_url, choices, directory)
 
-    if '9' in choices:
-        data['cookies'] = handle_cookies(website_url)
-        store_data({'url': website_url, 'cookies': data['cookies']}, directory, 'cookies')
-
-    if '10' in choices:
-        data['sitemap_urls'] = parse_sitemap(website_url)
-        store_data({'url': website_url, 'sitemap_urls': data['sitemap_urls']}, directory, 'sitemap_urls')
-
-    if '11' in choices:
-        content = retry_request(website_url).text
-        data['language'] = detect(content)
-        store_data({'url': website_url, 'language': data['language']}, directory, 'language')
+    # Append this run to the line-delimited results shared by every run
+    with open_sink('jsonl', os.path.join(main_directory, 'results.jsonl')) as sink:
+        sink.write(data)
 
-    if '12' in choices:
-        js_content = get_js_content(website_url, directory)
-        if js_content:
-            data['js_content'] = js_content
-        store_data({'url': website_url, 'js_content': data['js_content']}, directory, 'js_content')
+    print()
+    print(metrics.summary())
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     display_banner()
     main()
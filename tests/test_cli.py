@@ -0,0 +1,54 @@
+# This work is licensed under a Creative Commons Attribution 4.0 International License.
+# You must give appropriate credit, provide a link to the license, and indicate if changes were made.
+# Details: https://creativecommons.org/licenses/by/4.0/
+
+"""Batch mode regression tests against the local server of test_crawl.
+
+Usage: python -m unittest discover tests
+"""
+
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scrapez
+from test_crawl import Handler
+
+class BatchModeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        scrapez.clear_response_cache()
+
+    def tearDown(self):
+        scrapez.clear_response_cache()
+        self.directory.cleanup()
+
+    def run_cli(self, *arguments):
+        return scrapez.run_cli([*arguments, '--results-dir', os.path.join(self.directory.name, 'Results'),
+                                '--log-file', os.path.join(self.directory.name, 'scraper.log')])
+
+    def test_markdown_reports(self):
+        output = os.path.join(self.directory.name, 'reports')
+        self.assertEqual(self.run_cli(f'{self.base_url}/a', '--metadata', '-f', 'markdown', '-o', output), 0)
+        reports = [name for _, _, names in os.walk(output) for name in names]
+        self.assertTrue(reports)
+
+if __name__ == '__main__':
+    unittest.main()
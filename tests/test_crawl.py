@@ -0,0 +1,92 @@
+# This work is licensed under a Creative Commons Attribution 4.0 International License.
+# You must give appropriate credit, provide a link to the license, and indicate if changes were made.
+# Details: https://creativecommons.org/licenses/by/4.0/
+
+"""Crawl regression tests against a local HTTP server that answers conditional requests.
+
+Usage: python -m unittest discover tests
+"""
+
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrapez
+
+PAGES = {
+    '/': '<a href="/a">a</a> <a href="/b">b</a> <a href="/c">c</a> <a href="/missing">missing</a>',
+    '/a': '<p>a</p>',
+    '/b': '<p>b</p>',
+    '/c': '<p>c</p>',
+}
+MISSING_PAGE = '<a href="/only-linked-from-404">lost?</a>'
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            body = MISSING_PAGE if self.path == '/missing' else ''
+        else:
+            etag = f'"{len(body)}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+        body = f'<html><body>{body}</body></html>'.encode()
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class CrawlTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        scrapez.clear_response_cache()
+        scrapez.enable_http_cache(os.path.join(self.directory.name, 'http_cache.sqlite'))
+
+    def tearDown(self):
+        scrapez.disable_http_cache()
+        scrapez.clear_response_cache()
+        self.directory.cleanup()
+
+    def crawl(self):
+        return scrapez.scrape_pages_links(f'{self.base_url}/', set(), first_call=False)
+
+    def test_revalidated_pages_keep_their_links(self):
+        first = self.crawl()
+        scrapez.clear_response_cache()
+        # Every page now comes back as 304 Not Modified and is read from the HTTP cache
+        second = self.crawl()
+        self.assertEqual(sorted(first), sorted(second))
+        self.assertIn(f'{self.base_url}/c', second)
+
+    def test_error_page_links_are_not_followed(self):
+        links = self.crawl()
+        self.assertIn(f'{self.base_url}/missing', links)
+        self.assertNotIn(f'{self.base_url}/only-linked-from-404', links)
+
+if __name__ == '__main__':
+    unittest.main()